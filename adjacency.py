@@ -0,0 +1,73 @@
+"""Computes every adjacency bonus of a site map in one pass, from boolean tag planes and 3x3 neighbor counts"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+from marker import markers
+from site_grid import SiteMap, SparseSiteMap
+from marker_table import MARKER_KEYS, SPOOKY_MASK, MONOLITH_MASK, get_tag_mask
+
+VIS_ADJ_BONUS_SOURCE_MASK = get_tag_mask("adj-bonus")
+VIS_ADJ_BONUS_MASK = get_tag_mask("vis-adj-bonus")
+PRO_EDUCATIONAL_MASK = get_tag_mask("pro-educational")
+EDUCATIONAL_MASK = get_tag_mask("educational")
+PARTNERSHIP_MASKS = {partnership: np.array([partnership in markers[key].get_synergy_partnerships()
+                                            for key in MARKER_KEYS])
+                     for partnership in sorted({partnership for key in MARKER_KEYS
+                                                for partnership in markers[key].get_synergy_partnerships()})}
+
+@dataclass(frozen=True)
+class AdjacencyBonuses:
+    """The stat modifiers a site map earns from markers placed next to each other"""
+    visibility: float #visibility adjacency bonus
+    synergy_understandability: float #synergy partnerships
+    spooky_respectability: float #adjacent spooky markers
+    spooky_likability: float
+    pro_educational_understandability: float #pro-educational markers next to educational ones
+    monolith_usability: float #standing stones
+    monolith_respectability: float
+
+def count_neighbors(plane):
+    """Returns, for every tile, how many of its 8 neighbors are set in a boolean plane. Off-map neighbors count as
+    unset"""
+    padded = np.pad(plane.astype(np.int64), 1)
+    rows, cols = plane.shape
+    counts = np.zeros((rows, cols), dtype=np.int64)
+    for row_offset in range(3):
+        for col_offset in range(3):
+            if row_offset != 1 or col_offset != 1:
+                counts += padded[row_offset:row_offset+rows, col_offset:col_offset+cols]
+    return counts
+
+def count_adjacent_pairs(site_map, source_mask, neighbor_mask):
+    """Returns the number of (tile, neighbor) pairs where the tile has the source tag and the neighbor the
+    neighbor tag"""
+    if isinstance(site_map, SparseSiteMap):
+        return count_sparse_adjacent_pairs(site_map, source_mask, neighbor_mask)
+    codes = site_map.codes
+    return int(np.sum(source_mask[codes] * count_neighbors(neighbor_mask[codes])))
+
+def count_sparse_adjacent_pairs(site_map, source_mask, neighbor_mask):
+    """count_adjacent_pairs for a SparseSiteMap, visiting only its occupied tiles. Empty tiles carry no tags"""
+    neighbors = site_map.get_neighbors()
+    neighbor_tagged = (neighbors >= 0) & neighbor_mask[site_map.codes[np.maximum(neighbors, 0)]]
+    return int(np.sum(source_mask[site_map.codes] * neighbor_tagged))
+
+def get_adjacency_bonuses(site_map, goths):
+    """Returns the AdjacencyBonuses of a site map. Computed once per distinct map"""
+    return compute_adjacency_bonuses(SiteMap.coerce(site_map), goths)
+
+@lru_cache(maxsize=256)
+def compute_adjacency_bonuses(site_map, goths):
+    """Computes the AdjacencyBonuses of a SiteMap or SparseSiteMap"""
+    synergy_pairs = sum(count_adjacent_pairs(site_map, mask, mask) for mask in PARTNERSHIP_MASKS.values())
+    spooky_pairs = count_adjacent_pairs(site_map, SPOOKY_MASK, SPOOKY_MASK)
+    monolith_pairs = count_adjacent_pairs(site_map, MONOLITH_MASK, MONOLITH_MASK)
+    return AdjacencyBonuses(
+        visibility=count_adjacent_pairs(site_map, VIS_ADJ_BONUS_SOURCE_MASK, VIS_ADJ_BONUS_MASK)/2,
+        synergy_understandability=synergy_pairs*.5,
+        spooky_respectability=spooky_pairs*.5,
+        spooky_likability=spooky_pairs*.5 if goths else spooky_pairs*-.5,
+        pro_educational_understandability=count_adjacent_pairs(site_map, PRO_EDUCATIONAL_MASK, EDUCATIONAL_MASK),
+        monolith_usability=monolith_pairs*-.5,
+        monolith_respectability=monolith_pairs*.5)
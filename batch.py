@@ -0,0 +1,254 @@
+"""Runs many independent simulation trials of a single site layout across worker processes and aggregates them"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from statistics import NormalDist
+import simulate
+from hazards import HAZARD_MODEL
+from streams import new_root_seed, get_trial_rng
+
+MARGIN_KEYS = HAZARD_MODEL.names
+CHUNKS_PER_WORKER = 4 #more chunks than workers keeps the pool busy when some trials die early
+
+@dataclass
+class BatchResult:
+    """Aggregated outcome of a batch of simulation trials for one layout"""
+    trials: int = 0
+    breaches: int = 0
+    breach_counts: dict = field(default_factory=dict) #fatal event name -> number of trials it ended
+    margins: dict = field(default_factory=lambda: {key: [] for key in MARGIN_KEYS})
+
+    def survival_rate(self):
+        """Returns the fraction of trials in which the site was never breached"""
+        if self.trials == 0:
+            return 0
+        return (self.trials - self.breaches) / self.trials
+
+    def confidence_interval(self, confidence=.95):
+        """Returns a (low, high) Wilson score confidence interval on the survival rate"""
+        return get_wilson_interval(self.survival_rate(), self.trials, confidence)
+
+    def add_trial(self, dead, event_list, margins_dict):
+        """Folds the result of one call to simulate.simulate into the batch"""
+        self.trials += 1
+        if dead:
+            self.breaches += 1
+            cause = event_list[-1][1]
+            self.breach_counts[cause] = self.breach_counts.get(cause, 0) + 1
+        for key in MARGIN_KEYS:
+            self.margins[key].append(margins_dict[key])
+
+    def merge(self, other):
+        """Folds another batch's results into this one"""
+        self.trials += other.trials
+        self.breaches += other.breaches
+        for cause, count in other.breach_counts.items():
+            self.breach_counts[cause] = self.breach_counts.get(cause, 0) + count
+        for key in MARGIN_KEYS:
+            self.margins[key].extend(other.margins[key])
+        return self
+
+@dataclass
+class PairedComparison:
+    """Aggregated outcome of running two layouts on identical random streams, trial by trial"""
+    trials: int = 0
+    breaches_a: int = 0
+    breaches_b: int = 0
+    only_a: int = 0 #trials where layout a was breached and layout b was not
+    only_b: int = 0
+
+    def add_pair(self, dead_a, dead_b):
+        """Folds one pair of trials into the comparison"""
+        self.trials += 1
+        self.breaches_a += dead_a
+        self.breaches_b += dead_b
+        self.only_a += dead_a and not dead_b
+        self.only_b += dead_b and not dead_a
+
+    def merge(self, other):
+        """Folds another comparison's results into this one"""
+        self.trials += other.trials
+        self.breaches_a += other.breaches_a
+        self.breaches_b += other.breaches_b
+        self.only_a += other.only_a
+        self.only_b += other.only_b
+        return self
+
+    def breach_rate_difference(self):
+        """Returns layout a's breach rate minus layout b's"""
+        if self.trials == 0:
+            return 0
+        return (self.only_a - self.only_b) / self.trials
+
+    def confidence_interval(self, confidence=.95):
+        """Returns a (low, high) confidence interval on the breach rate difference, by Newcombe's method for paired
+        proportions: the Wilson intervals of the two breach rates combined through their continuity-corrected
+        correlation, so it stays wide when few trials disagree"""
+        if self.trials == 0:
+            return -1, 1
+        rate_a, rate_b = self.breaches_a / self.trials, self.breaches_b / self.trials
+        low_a, high_a = get_wilson_interval(rate_a, self.trials, confidence)
+        low_b, high_b = get_wilson_interval(rate_b, self.trials, confidence)
+        both = self.breaches_a - self.only_a
+        neither = self.trials - both - self.only_a - self.only_b
+        margins = self.breaches_a * (self.trials - self.breaches_a) * self.breaches_b * (self.trials - self.breaches_b)
+        excess = both*neither - self.only_a*self.only_b
+        if excess > 0:
+            excess = max(excess - self.trials/2, 0)
+        correlation = excess / math.sqrt(margins) if margins else 0
+        difference = rate_a - rate_b
+        low = difference - math.sqrt((rate_a - low_a)**2 - 2*correlation*(rate_a - low_a)*(high_b - rate_b) +
+                                     (high_b - rate_b)**2)
+        high = difference + math.sqrt((rate_b - low_b)**2 - 2*correlation*(rate_b - low_b)*(high_a - rate_a) +
+                                      (high_a - rate_a)**2)
+        return max(-1, low), min(1, high)
+
+@dataclass
+class SequentialResult:
+    """Outcome of a batch run that stopped once its stopping rule was met"""
+    batch: BatchResult
+    interval: tuple #(low, high) confidence interval on the survival rate
+    stopped_by: str #"precision", "above_threshold", "below_threshold" or "max_trials"
+
+    @property
+    def trials(self):
+        """The number of trials run"""
+        return self.batch.trials
+
+def get_wilson_interval(rate, trials, confidence=.95):
+    """Returns a (low, high) Wilson score confidence interval on a rate observed over `trials` trials"""
+    if trials == 0:
+        return 0, 1
+    z_score = NormalDist().inv_cdf((1 + confidence) / 2)
+    denominator = 1 + z_score**2/trials
+    center = (rate + z_score**2/(2*trials)) / denominator
+    half_width = z_score * math.sqrt(rate*(1-rate)/trials + z_score**2/(4*trials**2)) / denominator
+    return max(0, center - half_width), min(1, center + half_width)
+
+def get_stop_reason(result, confidence, half_width, threshold):
+    """Returns why a running batch may stop, or None if it should keep going"""
+    low, high = result.confidence_interval(confidence)
+    if half_width is not None and (high - low) / 2 <= half_width:
+        return "precision"
+    if threshold is not None and low > threshold:
+        return "above_threshold"
+    if threshold is not None and high < threshold:
+        return "below_threshold"
+    return None
+
+def run_trials(layout, buffs, years, trials, seed, first_trial=0, epoch_years=simulate.EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Runs trials first_trial to first_trial+trials-1 of a root seed in the current process and returns their
+    aggregate"""
+    result = BatchResult()
+    for trial in range(first_trial, first_trial+trials):
+        dead, event_list, _, margins_dict, _ = simulate.simulate(years, layout, buffs, rng=get_trial_rng(seed, trial),
+                                                                 epoch_years=epoch_years)
+        result.add_trial(dead, event_list, margins_dict)
+    return result
+
+def reproduce_trial(layout, buffs, years, seed, trial, epoch_years=simulate.EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Replays a single trial of a seeded batch and returns simulate.simulate's full result for it. epoch_years must
+    match the batch's"""
+    return simulate.simulate(years, layout, buffs, rng=get_trial_rng(seed, trial), epoch_years=epoch_years)
+
+def run_paired_trials(layout_a, layout_b, buffs, years, trials, seed, first_trial=0, #pylint: disable=too-many-arguments
+                      epoch_years=simulate.EPOCH_YEARS):
+    """Runs trials first_trial to first_trial+trials-1 of a root seed on both layouts in the current process. Both
+    layouts of a trial start from the same stream, so they see the same tech states, material values and dice until
+    their draws first differ, which is at the latest when one of them is breached"""
+    result = PairedComparison()
+    for trial in range(first_trial, first_trial+trials):
+        dead_a = simulate.simulate(years, layout_a, buffs, rng=get_trial_rng(seed, trial), epoch_years=epoch_years)[0]
+        dead_b = simulate.simulate(years, layout_b, buffs, rng=get_trial_rng(seed, trial), epoch_years=epoch_years)[0]
+        result.add_pair(dead_a, dead_b)
+    return result
+
+def split_trials(trials, chunks):
+    """Splits a trial count into at most `chunks` near-equal positive parts"""
+    chunks = max(1, min(chunks, trials))
+    base, extra = divmod(trials, chunks)
+    return [base + (1 if i < extra else 0) for i in range(chunks)]
+
+def simulate_many(layout, buffs, years, trials, workers=None, seed=None, epoch_years=simulate.EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Runs `trials` independent simulations of a layout, fanned out over a process pool, and returns a BatchResult.
+    workers defaults to the number of CPUs; workers=1 runs everything in the calling process. Trial n draws from
+    the nth stream of `seed` (a fresh seed if None), so results do not depend on the worker count"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if seed is None:
+        seed = new_root_seed()
+    if workers <= 1 or trials <= 1:
+        return run_trials(layout, buffs, years, trials, seed, epoch_years=epoch_years)
+
+    result = BatchResult()
+    chunk_sizes = split_trials(trials, workers*CHUNKS_PER_WORKER)
+    chunk_starts = [sum(chunk_sizes[:i]) for i in range(len(chunk_sizes))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_trials, layout, buffs, years, chunk_size, seed, chunk_start, epoch_years)
+                   for chunk_size, chunk_start in zip(chunk_sizes, chunk_starts)]
+        for future in futures:
+            result.merge(future.result())
+    return result
+
+def compare_layouts(layout_a, layout_b, buffs, years, trials, workers=None, seed=None, #pylint: disable=too-many-arguments
+                    epoch_years=simulate.EPOCH_YEARS):
+    """Runs `trials` paired simulations of two layouts with common random numbers, fanned out over a process pool
+    like simulate_many, and returns a PairedComparison"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if seed is None:
+        seed = new_root_seed()
+    if workers <= 1 or trials <= 1:
+        return run_paired_trials(layout_a, layout_b, buffs, years, trials, seed, epoch_years=epoch_years)
+
+    result = PairedComparison()
+    chunk_sizes = split_trials(trials, workers*CHUNKS_PER_WORKER)
+    chunk_starts = [sum(chunk_sizes[:i]) for i in range(len(chunk_sizes))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_paired_trials, layout_a, layout_b, buffs, years, chunk_size, seed, chunk_start,
+                               epoch_years)
+                   for chunk_size, chunk_start in zip(chunk_sizes, chunk_starts)]
+        for future in futures:
+            result.merge(future.result())
+    return result
+
+def simulate_until(layout, buffs, years, half_width=None, threshold=None, confidence=.95, chunk_size=200, #pylint: disable=too-many-arguments,too-many-locals
+                   max_trials=100000, workers=None, seed=None, epoch_years=simulate.EPOCH_YEARS):
+    """Runs trials of a layout in chunks until the survival rate's confidence interval is narrower than
+    2*half_width, or lies wholly above or below threshold, or max_trials have run, and returns a SequentialResult.
+    Each round runs one chunk per worker. Trial n draws from the nth stream of `seed`, as in simulate_many, so a
+    seeded run stops at the same point whatever the worker count. Checking after every chunk makes the interval
+    slightly optimistic, so ask for a little more confidence than a single fixed-size run would need"""
+    if half_width is None and threshold is None:
+        raise ValueError("simulate_until needs a half_width or a threshold to stop at")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if seed is None:
+        seed = new_root_seed()
+
+    result = BatchResult()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        stopped_by = None
+        while stopped_by is None and result.trials < max_trials:
+            chunk_sizes = split_trials(min(chunk_size*workers, max_trials - result.trials), workers)
+            chunk_starts = [result.trials + sum(chunk_sizes[:i]) for i in range(len(chunk_sizes))]
+            if pool is None:
+                chunks = [run_trials(layout, buffs, years, size, seed, start, epoch_years)
+                          for size, start in zip(chunk_sizes, chunk_starts)]
+            else:
+                chunks = [future.result() for future in
+                          [pool.submit(run_trials, layout, buffs, years, size, seed, start, epoch_years)
+                           for size, start in zip(chunk_sizes, chunk_starts)]]
+            for chunk in chunks:
+                result.merge(chunk)
+                stopped_by = get_stop_reason(result, confidence, half_width, threshold)
+                if stopped_by is not None:
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return SequentialResult(batch=result, interval=result.confidence_interval(confidence),
+                            stopped_by=stopped_by or "max_trials")
@@ -0,0 +1,265 @@
+"""Times the simulation and map hot paths on a set of canned layouts. Run `python bench.py` to print a report,
+`--save FILE` to write the results as JSON and `--baseline FILE` to compare them against an earlier saved run"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass, asdict
+import numpy as np
+import simulate
+import exact
+import vector_simulate
+import marker_table
+import adjacency
+from marker import markers
+from site_grid import SiteMap
+from profiling import SimulationProfile
+from site_layout import MAP_ROWS, MAP_COLS, get_blank_map
+
+BUFFS = ("ray-cats", "satellites")
+BENCH_YEARS = 10000
+PERCENTILES = (50, 90, 99)
+DEFAULT_TOLERANCE = .1 #a median this much slower than the baseline's counts as a regression
+
+def get_monolith_layout():
+    """Returns a site ringed by monoliths, enough of them to let stonehenge happen"""
+    rows = get_blank_map()
+    monoliths = ("granite-monolith", "metal-monolith", "wooden-monolith", "single-stone-monolith")
+    for col_num in range(3, 13):
+        rows[3][col_num] = monoliths[col_num % len(monoliths)]
+        rows[8][col_num] = monoliths[(col_num+1) % len(monoliths)]
+    return rows
+
+def get_terraforming_layout():
+    """Returns a site flanked by large contiguous blocks of terraforming markers"""
+    rows = get_blank_map()
+    for row_num in range(MAP_ROWS):
+        for col_num in range(0, 5):
+            rows[row_num][col_num] = "rubble-field"
+        for col_num in range(11, MAP_COLS):
+            rows[row_num][col_num] = "spike-field" if row_num < 6 else "black-hole"
+    return rows
+
+def get_spooky_layout():
+    """Returns a site surrounded by tight clusters of spooky markers"""
+    rows = get_blank_map()
+    spooky = ("cemetery", "death-sculpture", "disgust-faces", "aeolian-structures", "menacing-earthworks")
+    for row_num in range(3, 9):
+        for col_num in range(5, 11):
+            if rows[row_num][col_num] == "null":
+                rows[row_num][col_num] = spooky[(row_num+col_num) % len(spooky)]
+    return rows
+
+def get_packed_layout():
+    """Returns a site with every open tile holding a purchasable marker, chosen with a fixed seed"""
+    rows = get_blank_map()
+    placeable = sorted(key for key, marker in markers.items() if marker.is_purchasable() and not marker.is_global())
+    rng = random.Random(0)
+    for row in rows:
+        for col_num, tile in enumerate(row):
+            if tile == "null":
+                row[col_num] = rng.choice(placeable)
+    return rows
+
+LAYOUTS = {"empty": get_blank_map,
+           "monolith-heavy": get_monolith_layout,
+           "terraforming-blocks": get_terraforming_layout,
+           "spooky-clusters": get_spooky_layout,
+           "packed": get_packed_layout}
+
+@dataclass
+class Timing:
+    """Per-call latencies of one benchmark, in seconds"""
+    calls: int
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    per_sec: float
+
+    @classmethod
+    def from_samples(cls, samples):
+        """Summarizes a list of per-call wall times"""
+        samples = np.asarray(samples)
+        p50, p90, p99 = np.percentile(samples, PERCENTILES).tolist()
+        mean = float(samples.mean())
+        return cls(calls=len(samples), mean=mean, p50=p50, p90=p90, p99=p99, per_sec=1/mean if mean else 0)
+
+def clear_caches():
+    """Empties every memoized stats, adjacency and block-labelling table so the next call pays the full cost"""
+    for module in (simulate, marker_table, adjacency):
+        for value in vars(module).values():
+            if hasattr(value, "cache_clear"):
+                value.cache_clear()
+
+def time_calls(func, calls, cold=False):
+    """Calls func `calls` times and returns the wall time of each call. A cold run clears the caches before each
+    call, outside the timed region"""
+    samples = []
+    for _ in range(calls):
+        if cold:
+            clear_caches()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_layout(name, site_map, calls, trials):
+    """Returns {benchmark name: Timing} for every hot path on one layout"""
+    buffs = list(BUFFS)
+    event_list = [(0, "null")]
+    year, sot = 4000, simulate.MEDIUM_TECH
+    rng = random.Random(0)
+    results = {}
+
+    def stats():
+        return simulate.get_stats(site_map, buffs, year, sot, event_list)
+    def terraforming():
+        return simulate.get_massive_terraforming_bonus(site_map, year, sot, False, False, False, False)
+    def random_event():
+        return simulate.get_random_event(year, sot, site_map, .5, .5, .5, .5, .5, buffs, rng=rng)
+    def full_run():
+        return simulate.simulate(BENCH_YEARS, site_map, buffs, rng=rng)
+
+    clear_caches()
+    results[f"get_stats/cold/{name}"] = Timing.from_samples(time_calls(stats, calls, cold=True))
+    results[f"get_stats/warm/{name}"] = Timing.from_samples(time_calls(stats, calls))
+    results[f"get_massive_terraforming_bonus/cold/{name}"] = \
+        Timing.from_samples(time_calls(terraforming, calls, cold=True))
+    results[f"get_massive_terraforming_bonus/warm/{name}"] = Timing.from_samples(time_calls(terraforming, calls))
+    results[f"get_random_event/{name}"] = Timing.from_samples(time_calls(random_event, calls))
+    clear_caches()
+    results[f"simulate/{BENCH_YEARS}y/{name}"] = Timing.from_samples(time_calls(full_run, trials))
+    return results
+
+def bench_map_update(calls):
+    """Returns {benchmark name: Timing} for Map.update stepping the visitor simulation, or {} if pyxel is not
+    installed"""
+    try:
+        from map import Map #pylint: disable=import-outside-toplevel
+        from player import Player #pylint: disable=import-outside-toplevel
+    except ImportError:
+        return {}
+    game_map = Map({"mining": .5, "archaeology": .5, "dams": .5, "teens": .5, "tunnels": .5})
+    player = Player()
+    return {"Map.update/simulation": Timing.from_samples(time_calls(lambda: game_map.update(player, True), calls))}
+
+def profile_layout(site_map, trials):
+    """Returns the merged SimulationProfile of `trials` full runs of one layout"""
+    rng = random.Random(0)
+    profile = SimulationProfile(runs=0)
+    for _ in range(trials):
+        profile.merge(simulate.simulate(BENCH_YEARS, site_map, list(BUFFS), rng=rng, profile=True)[5])
+    return profile
+
+def compare_epoch_lengths(site_map, years, trials):
+    """Returns (epoch years, exact survival rate, seconds for the exact run, seconds per simulate.simulate trial,
+    seconds per vectorized trial) for every step length in simulate.EPOCH_LENGTHS. The exact survival rate at the
+    shortest step is the reference the longer steps are compared against"""
+    rows = []
+    buffs = list(BUFFS)
+    for epoch_years in simulate.EPOCH_LENGTHS:
+        start = time.perf_counter()
+        survival = exact.simulate_exact(years, site_map, buffs, epoch_years=epoch_years).survival_rate()
+        exact_seconds = time.perf_counter() - start
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(trials):
+            simulate.simulate(years, site_map, buffs, rng=rng, epoch_years=epoch_years)
+        scalar_seconds = (time.perf_counter() - start) / trials
+        start = time.perf_counter()
+        vector_simulate.simulate_batch(years, site_map, buffs, trials, np.random.default_rng(0), epoch_years)
+        vector_seconds = (time.perf_counter() - start) / trials
+        rows.append((epoch_years, survival, exact_seconds, scalar_seconds, vector_seconds))
+    return rows
+
+def format_epoch_comparison(rows):
+    """Returns an epoch length comparison as a table, with each step's survival error against the shortest step"""
+    reference = min(rows)[1]
+    lines = [f"{'epoch years':>12}{'survival':>10}{'error':>10}{'exact s':>10}{'scalar ms':>11}{'vector ms':>11}"]
+    for epoch_years, survival, exact_seconds, scalar_seconds, vector_seconds in rows:
+        lines.append(f"{epoch_years:>12}{survival:>10.4f}{survival-reference:>+10.4f}{exact_seconds:>10.2f}"
+                     f"{scalar_seconds*1000:>11.3f}{vector_seconds*1000:>11.3f}")
+    return "\n".join(lines)
+
+def run_benchmarks(calls=200, trials=50, layouts=None):
+    """Runs every benchmark and returns a JSON-ready dict of the machine it ran on and each Timing"""
+    results = {}
+    for name in layouts or LAYOUTS:
+        results.update(bench_layout(name, SiteMap.from_names(LAYOUTS[name]()), calls, trials))
+    results.update(bench_map_update(calls))
+    return {"machine": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform()},
+            "calls": calls, "trials": trials,
+            "results": {key: asdict(timing) for key, timing in results.items()}}
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns (benchmark name, baseline median, median, ratio, regressed) for every benchmark in both runs"""
+    rows = []
+    for key, timing in report["results"].items():
+        if key not in baseline["results"]:
+            continue
+        before = baseline["results"][key]["p50"]
+        ratio = timing["p50"] / before if before else float("inf")
+        rows.append((key, before, timing["p50"], ratio, ratio > 1 + tolerance))
+    return rows
+
+def format_report(report):
+    """Returns the report as a table of per-call latencies in milliseconds"""
+    lines = [f"{'benchmark':<56}{'calls':>7}{'per sec':>11}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"]
+    for key, timing in report["results"].items():
+        lines.append(f"{key:<56}{timing['calls']:>7}{timing['per_sec']:>11.1f}{timing['p50']*1000:>10.3f}"
+                     f"{timing['p90']*1000:>10.3f}{timing['p99']*1000:>10.3f}")
+    return "\n".join(lines)
+
+def format_comparison(rows):
+    """Returns a baseline comparison as a table, flagging regressions"""
+    lines = [f"{'benchmark':<56}{'base p50 ms':>13}{'p50 ms':>10}{'ratio':>8}"]
+    for key, before, after, ratio, regressed in rows:
+        flag = "  SLOWER" if regressed else ""
+        lines.append(f"{key:<56}{before*1000:>13.3f}{after*1000:>10.3f}{ratio:>8.2f}{flag}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    """Runs the benchmarks from the command line. Exits with status 1 if any benchmark regressed against the
+    baseline"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200, help="calls per hot-function benchmark")
+    parser.add_argument("--trials", type=int, default=50, help=f"full {BENCH_YEARS}-year runs per layout")
+    parser.add_argument("--layout", action="append", choices=LAYOUTS, help="only run these layouts")
+    parser.add_argument("--profile", action="store_true", help="also print where each layout's full runs spend time")
+    parser.add_argument("--epochs", action="store_true",
+                        help="also compare the accuracy and cost of each epoch length on every layout")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved by an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="fractional slowdown of the median tolerated before flagging a regression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.calls, args.trials, args.layout)
+    print(format_report(report))
+    if args.profile:
+        for name in args.layout or LAYOUTS:
+            print(f"\n{name}")
+            print(profile_layout(SiteMap.from_names(LAYOUTS[name]()), args.trials).format())
+    if args.epochs:
+        for name in args.layout or LAYOUTS:
+            print(f"\n{name}")
+            print(format_epoch_comparison(compare_epoch_lengths(SiteMap.from_names(LAYOUTS[name]()), BENCH_YEARS,
+                                                                args.trials)))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            rows = compare(report, json.load(file), args.tolerance)
+        print()
+        print(format_comparison(rows))
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Keeps a bitmask of the events a trial has seen, so checking whether an event has happened is O(1) and the flag
+word can key caches of stats"""
+
+from event import events
+
+EVENT_BITS = {name: 1 << bit for bit, name in enumerate(events)}
+
+#events whose having happened changes the stats computed by simulate.get_stats
+STAT_EVENTS = ("cat-holics", "stonehenge", "flood", "goths", "faultline", "park")
+STAT_EVENT_MASK = sum(EVENT_BITS[name] for name in STAT_EVENTS)
+
+class EventList(list):
+    """A list of (year, event) tuples that also tracks a bitmask of the events it holds and the year each of them
+    first happened. Only append should be used to add events"""
+    def __init__(self, entries=()):
+        super().__init__()
+        self.flags = 0
+        self.first_years = {}
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        """Adds a (year, event) tuple and updates the flags"""
+        super().append(entry)
+        year, name = entry
+        if not self.has(name):
+            self.flags |= EVENT_BITS.get(name, 0)
+            self.first_years[name] = year
+
+    def has(self, name):
+        """Returns true if the event has happened. Unknown event names never have"""
+        return bool(self.flags & EVENT_BITS.get(name, 0))
+
+def get_event_flags(event_list):
+    """Returns the bitmask of the events in an event list, which may be an EventList or a plain list of tuples"""
+    if isinstance(event_list, EventList):
+        return event_list.flags
+    flags = 0
+    for _, name in event_list:
+        flags |= EVENT_BITS.get(name, 0)
+    return flags
+
+def has_event(flags, name):
+    """Returns true if the event's bit is set in a flag word. Unknown event names are never set"""
+    return bool(flags & EVENT_BITS.get(name, 0))
@@ -0,0 +1,131 @@
+"""Computes a layout's exact breach probability by propagating a probability distribution over the simulation's
+discrete state (map variant and sticky event flags) epoch by epoch, instead of sampling trials"""
+
+from dataclasses import dataclass, field
+import simulate
+from site_grid import SiteMap
+from marker_table import MONOLITH_MASK
+from event_flags import EVENT_BITS, STAT_EVENT_MASK
+from hazards import HAZARD_MODEL
+from vector_simulate import EPOCH_YEARS, VIKINGS_VARIANT, RUINED_VARIANT, INSTAKILL_EVENTS, \
+    HAZARD_EVENTS, get_map_variants
+
+#states holding less probability than this are dropped
+DEFAULT_TOLERANCE = 1e-12
+
+@dataclass
+class ExactResult:
+    """Exact outcome probabilities of a layout over a horizon"""
+    years: int
+    breach_probability: float = 0
+    breach_probabilities: dict = field(default_factory=dict) #fatal event name -> probability it ends the trial
+
+    def survival_rate(self):
+        """Returns the probability that the site is never breached"""
+        return 1 - self.breach_probability
+
+def get_tech_probabilities(current_year):
+    """Returns the probability of each state of tech in simulate.state_of_tech"""
+    if current_year <= 2300:
+        return {2: .8, 1: .15, 0: .05}
+    if current_year <= 5000:
+        return {2: .7, 1: .2, 0: .1}
+    return {2: .8, 1: .1, 0: .1}
+
+def get_value_of_materials_probabilities(current_year):
+    """Returns the probability of each value of materials in simulate.get_value_of_materials"""
+    if current_year < 2300:
+        return {1: .5, 0: .5}
+    return {1: .33, 0: .67}
+
+def get_event_probabilities(current_year, sot, num_monoliths, respectability, global_buffs, #pylint: disable=too-many-arguments
+                            epoch_years=EPOCH_YEARS):
+    """Returns the probability of each event simulate.get_random_event can produce in a step of epoch_years"""
+    probabilities = {}
+    covered = 0 #every rung fires on die < threshold, so earlier rungs claim [0, covered)
+    for name, condition, threshold in simulate.get_event_ladder(current_year, sot, num_monoliths, respectability,
+                                                                global_buffs):
+        if condition and threshold > covered:
+            odds = threshold - covered
+            if epoch_years != EPOCH_YEARS: #compounded over the step, as simulate.get_ladder_die does
+                odds = 1-(1-odds)**(epoch_years/EPOCH_YEARS)
+            probabilities[name] = odds
+            covered = threshold
+    return probabilities
+
+def get_hazard_probabilities(current_year, sot, stats, epoch_years=EPOCH_YEARS):
+    """Returns the probability of each hazard breaching the site in a step of epoch_years, in the order
+    simulate.simulate rolls them, each given that the earlier ones did not. Averages over the value of materials and
+    over the bins of the miners' value die"""
+    usability, visibility, respectability, likability, understandability = stats
+    kop = simulate.get_knowledge_of_past(visibility, respectability, likability, understandability)
+    probabilities = [0] * len(HAZARD_MODEL.hazards)
+    for vom, vom_probability in get_value_of_materials_probabilities(current_year).items():
+        for value_die, die_probability in HAZARD_MODEL.get_uniform_bins("value_die"):
+            probs = HAZARD_MODEL.get_probabilities((kop, current_year-epoch_years, usability, visibility,
+                                                    respectability, sot, vom, value_die), understandability,
+                                                   epoch_years)
+            for hazard, prob in enumerate(probs):
+                probabilities[hazard] += vom_probability * die_probability * clamp_probability(prob)
+    return tuple(probabilities)
+
+def clamp_probability(prob):
+    """Returns the chance that a uniform die roll lands below prob"""
+    return min(max(prob, 0), 1)
+
+def get_next_state(state, event):
+    """Returns the (map variant, event flags) state after an event"""
+    variant, flags = state
+    if event == "vikings":
+        variant |= VIKINGS_VARIANT
+    elif event in ("earthquake", "faultline"):
+        variant |= RUINED_VARIANT
+    flags |= EVENT_BITS.get(event, 0) & STAT_EVENT_MASK
+    return variant, flags
+
+def get_state_stats(map_variants, global_buffs, current_year, sot, state): #pylint: disable=too-many-arguments
+    """Returns simulate.get_stats for a (map variant, event flags) state"""
+    variant, flags = state
+    return simulate.get_stats_for_flags(map_variants[variant], tuple(global_buffs), current_year, sot, flags)
+
+def simulate_exact(years, site_map, global_buffs, tolerance=DEFAULT_TOLERANCE, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-locals
+    """Returns the ExactResult of simulating a layout for the given number of years, stepping epoch_years at a time
+    as simulate.simulate does"""
+    site_map = SiteMap.coerce(site_map)
+    map_variants = get_map_variants(site_map)
+    num_monoliths = int(MONOLITH_MASK @ site_map.marker_counts())
+    result = ExactResult(years=years)
+    breaches = dict.fromkeys(INSTAKILL_EVENTS + HAZARD_EVENTS, 0)
+    distribution = {(0, 0): 1.0}
+
+    for current_year, step_years in simulate.get_steps(years, epoch_years):
+        next_distribution = {}
+        for state, state_probability in distribution.items():
+            for sot, sot_probability in get_tech_probabilities(current_year).items():
+                mass = state_probability * sot_probability
+                stats = get_state_stats(map_variants, global_buffs, current_year, sot, state)
+
+                hazard_probabilities = get_hazard_probabilities(current_year, sot, stats, step_years)
+                survival = 1
+                hazard_shares = []
+                for prob in hazard_probabilities:
+                    hazard_shares.append(survival * prob)
+                    survival *= 1 - prob
+
+                event_probabilities = get_event_probabilities(current_year, sot, num_monoliths, stats[2],
+                                                              global_buffs, step_years)
+                event_probabilities[""] = 1 - sum(event_probabilities.values())
+                for event, event_probability in event_probabilities.items():
+                    event_mass = mass * event_probability
+                    if event in INSTAKILL_EVENTS:
+                        breaches[event] += event_mass
+                        continue
+                    for name, share in zip(HAZARD_EVENTS, hazard_shares):
+                        breaches[name] += event_mass * share
+                    next_state = get_next_state(state, event)
+                    next_distribution[next_state] = next_distribution.get(next_state, 0) + event_mass * survival
+        distribution = {state: mass for state, mass in next_distribution.items() if mass > tolerance}
+
+    result.breach_probabilities = {name: prob for name, prob in breaches.items() if prob > 0}
+    result.breach_probability = sum(breaches.values())
+    return result
@@ -0,0 +1,216 @@
+"""Declares the intruders that can breach the site as threshold tables over the knowledge of the past, the year and
+the site's stats, and compiles them into flat lookup arrays. A HazardModel evaluates every hazard of one trial with a
+few list lookups, or of a whole batch of trials in one array step, so adding an intruder means adding a table here
+rather than another branch ladder and die-roll block in the epoch loop"""
+
+import math
+import operator
+from bisect import bisect_right
+from dataclasses import dataclass
+import numpy as np
+
+#what a hazard's odds can depend on, in the order HazardModel takes them
+FEATURES = ("kop", "start_year", "usability", "visibility", "respectability", "sot", "vom", "value_die")
+FEATURE_INDEX = {feature: index for index, feature in enumerate(FEATURES)}
+VISIBILITY = FEATURE_INDEX["visibility"]
+
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq}
+
+#how a rule's base odds are scaled by the site's understandability and visibility
+SCALE_NAMES = ("constant", "understanding_below_half", "understanding", "awareness", "drill_knowledge")
+SCALE_INDEX = {name: index for index, name in enumerate(SCALE_NAMES)}
+
+def get_scales(understandability, visibility):
+    """Returns the value of each scale, in SCALE_NAMES order. Works on scalars or on arrays of trials"""
+    return (1,
+            (.5 - understandability)/.5,
+            1 - understandability,
+            1 - understandability*visibility,
+            .001*(1 - understandability)) #miners who know of the site mostly drill elsewhere
+
+@dataclass(frozen=True)
+class Rule:
+    """One row of a hazard table: when every condition holds, the odds are base times the named scale. Conditions
+    are "feature op value" strings, such as "start_year < 3000" """
+    when: tuple
+    base: float
+    scale: str = "constant"
+
+@dataclass(frozen=True)
+class Hazard:
+    """An intruder that can breach the site. The first rule whose conditions hold gives its odds, and no match means
+    it never comes. The odds are the chance of at least one breach in span_years"""
+    name: str #key of its margin and name in sink messages
+    event: str #event logged when it breaches the site
+    rules: tuple
+    span_years: int = 200
+
+#yearly chance of a bad bore over the site's 16 square miles, at a value multiplier of 1. The source's 83 boreholes
+#per square mile per 1000 years always breached the site, so the rate is far lower
+DRILL_RATE = .001*16/1000
+#multiplier of the drill rate for high (1) and low (0) value materials, as (value die at most, multiplier) steps
+VALUE_MULTIPLIERS = {1: ((.19, .25), (.38, .5), (.88, 1), (.94, 2), (1, 4)),
+                     0: ((.35, .01), (.85, .1), (.925, .25), (1, .5))}
+
+MINING_RULES = tuple(Rule((knowledge, f"vom == {vom}", f"value_die <= {die}"), multiplier*DRILL_RATE, scale)
+                     for knowledge, scale in (("kop == 0", "constant"), ("kop >= 1", "drill_knowledge"))
+                     for vom, steps in VALUE_MULTIPLIERS.items()
+                     for die, multiplier in steps)
+
+ARCHAEOLOGY_RULES = (
+    Rule(("kop == 3",), 0),
+    Rule(("kop == 2", "start_year < 3000"), 0),
+    Rule(("kop == 2", "start_year < 5000"), .01, "understanding_below_half"),
+    Rule(("kop == 2",), .02, "understanding_below_half"),
+    Rule(("kop == 1", "start_year < 3000"), .01, "understanding_below_half"),
+    Rule(("kop == 1", "start_year < 5000"), .02, "understanding_below_half"),
+    Rule(("kop == 1",), .03, "understanding_below_half"),
+    Rule(("start_year < 3000",), 0),
+    Rule((), .001, "understanding_below_half"),
+)
+
+DAM_RULES = (
+    Rule(("kop == 3",), 0),
+    Rule(("start_year < 2300", "usability > .5"), .002, "understanding_below_half"),
+    Rule(("start_year < 2300", "usability > 0"), .001, "understanding_below_half"),
+    Rule(("start_year < 2300",), .0005),
+    Rule(("start_year < 5000", "usability > .51"), .003, "understanding_below_half"),
+    Rule(("start_year < 5000", "usability > 0"), .002, "understanding_below_half"),
+    Rule(("start_year < 5000",), .0001, "understanding_below_half"),
+    Rule(("usability > .5",), .005, "understanding_below_half"),
+    Rule(("usability > 0",), .004, "understanding_below_half"),
+    Rule((), .0003, "understanding_below_half"),
+)
+
+TEEN_RULES = (
+    Rule(("visibility < .3",), 0),
+    Rule(("respectability > .8",), 0),
+    Rule(("respectability > .6",), .0001, "understanding"),
+    Rule(("respectability > .3",), .001, "understanding"),
+    Rule((), .003, "understanding"),
+)
+
+TUNNEL_RULES = (
+    Rule(("sot == 0",), 0), #only medium and high tech societies dig transit tunnels
+    Rule((), .001, "awareness"),
+)
+
+#in the order simulate.simulate rolls them
+HAZARDS = (
+    Hazard("mining", "miners", MINING_RULES, span_years=1),
+    Hazard("archaeology", "archaeologists", ARCHAEOLOGY_RULES),
+    Hazard("dams", "dams", DAM_RULES),
+    Hazard("teens", "teens", TEEN_RULES),
+    Hazard("tunnels", "tunnel", TUNNEL_RULES),
+)
+
+def parse_condition(condition):
+    """Returns the (feature index, operator, value) of a "feature op value" condition"""
+    feature, symbol, value = condition.split()
+    if feature not in FEATURE_INDEX or symbol not in OPERATORS:
+        raise ValueError(f"bad hazard condition: {condition}")
+    return FEATURE_INDEX[feature], symbol, float(value)
+
+def get_cuts(symbol, value):
+    """Returns the points at which a condition can change from false to true or back. A value x falls in the bin
+    after every cut at most x, so "> v" and "<= v" cut just above v"""
+    above = math.nextafter(value, math.inf)
+    return {"<": (value,), ">=": (value,), ">": (above,), "<=": (above,), "==": (value, above)}[symbol]
+
+def get_representatives(cuts):
+    """Returns a value in each bin of a sorted list of cuts"""
+    if not cuts:
+        return np.zeros(1)
+    return np.array([cuts[0] - 1, *cuts])
+
+class HazardModel:
+    """A set of hazards compiled into one lookup table. Each hazard gets a dense block of cells indexed by the bins
+    of the features its rules read, holding the base odds and scale of the rule that matches there"""
+    def __init__(self, hazards):
+        self.hazards = tuple(hazards)
+        self.names = tuple(hazard.name for hazard in self.hazards)
+        self.events = tuple(hazard.event for hazard in self.hazards)
+        rules = [[(rule, [parse_condition(condition) for condition in rule.when]) for rule in hazard.rules]
+                 for hazard in self.hazards]
+        cuts = [set() for _ in FEATURES]
+        for hazard_rules in rules:
+            for _, conditions in hazard_rules:
+                for feature, symbol, value in conditions:
+                    cuts[feature].update(get_cuts(symbol, value))
+        self.cuts = [sorted(feature_cuts) for feature_cuts in cuts]
+        self.cut_arrays = [np.array(feature_cuts) for feature_cuts in self.cuts]
+
+        bases, kinds, offsets = [], [], []
+        self.strides = np.zeros((len(self.hazards), len(FEATURES)), dtype=np.int64)
+        for hazard, hazard_rules in enumerate(rules):
+            used = sorted({feature for _, conditions in hazard_rules for feature, _, _ in conditions})
+            grids = np.meshgrid(*(get_representatives(self.cuts[feature]) for feature in used), indexing="ij")
+            values = dict(zip(used, grids))
+            shape = grids[0].shape if grids else ()
+            base = np.zeros(shape)
+            kind = np.zeros(shape, dtype=np.int64)
+            unmatched = np.ones(shape, dtype=bool)
+            for rule, conditions in hazard_rules:
+                match = unmatched.copy()
+                for feature, symbol, value in conditions:
+                    match &= OPERATORS[symbol](values[feature], value)
+                base[match] = rule.base
+                kind[match] = SCALE_INDEX[rule.scale]
+                unmatched &= ~match
+            stride = 1
+            for feature, size in reversed(list(zip(used, shape))):
+                self.strides[hazard, feature] = stride
+                stride *= size
+            offsets.append(sum(block.size for block in bases))
+            bases.append(base.ravel())
+            kinds.append(kind.ravel())
+        self.base = np.concatenate(bases)
+        self.kind = np.concatenate(kinds)
+        self.offsets = np.array(offsets)
+        self.spans = np.array([hazard.span_years for hazard in self.hazards], dtype=float)
+
+        #the one-trial path looks up the (base, scale) of every hazard by the tuple of feature bins, in plain
+        #Python, since NumPy's per-call overhead would dominate a single trial
+        self.span_list = [hazard.span_years for hazard in self.hazards]
+        self.cells = {}
+
+    def get_cells(self, bins):
+        """Returns the (base odds, scale index, span) of every hazard for a tuple of feature bins"""
+        cells = self.cells.get(bins)
+        if cells is None:
+            indices = self.offsets + self.strides @ np.array(bins)
+            cells = self.cells[bins] = tuple(zip(self.base[indices].tolist(), self.kind[indices].tolist(),
+                                                 self.span_list))
+        return cells
+
+    def get_probabilities(self, values, understandability, years):
+        """Returns the chance of each hazard breaching the site of one trial over `years`. values holds the
+        FEATURES in order"""
+        scales = get_scales(understandability, values[VISIBILITY])
+        probs = []
+        for base, kind, span_years in self.get_cells(tuple(map(bisect_right, self.cuts, values))):
+            prob = base*scales[kind]
+            if prob and years != span_years: #no odds stay no odds over any span
+                prob = 1-max(0, 1-prob)**(years/span_years)
+            probs.append(prob)
+        return probs
+
+    def get_batch_probabilities(self, values, understandability, years):
+        """Vectorized get_probabilities. values holds a scalar or an array of trials per feature; returns a
+        (hazards, trials) array"""
+        values = list(np.broadcast_arrays(*values, understandability))
+        understandability = values.pop()
+        bins = np.stack([np.searchsorted(cuts, value, side="right") for cuts, value in zip(self.cut_arrays, values)])
+        cells = self.offsets[:, None] + self.strides @ bins
+        scales = np.stack(np.broadcast_arrays(*get_scales(understandability, values[VISIBILITY])))
+        prob = self.base[cells] * scales[self.kind[cells], np.arange(cells.shape[1])]
+        spans = self.spans[:, None]
+        return np.where(spans == years, prob, 1-np.maximum(0, 1-prob)**(years/spans))
+
+    def get_uniform_bins(self, feature):
+        """Returns (representative value, probability) for every bin of a feature drawn uniformly from [0, 1), such
+        as value_die, so exact calculations can sum over the bins instead of the die"""
+        edges = np.clip([0, *self.cuts[FEATURE_INDEX[feature]], 1], 0, 1)
+        return [(float(low), float(high - low)) for low, high in zip(edges[:-1], edges[1:]) if high > low]
+
+HAZARD_MODEL = HazardModel(HAZARDS)
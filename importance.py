@@ -0,0 +1,148 @@
+"""Estimates small breach probabilities by importance sampling. Runs the vectorized simulation with the instakill
+event die and the hazard dice drawn from a defensive mixture that lands in the fatal range more often than a fair
+die would, and weights each trial by the likelihood ratio of the dice it rolled, so the estimate stays unbiased"""
+
+import math
+from dataclasses import dataclass, field
+import numpy as np
+from site_grid import SiteMap
+from marker_table import MONOLITH_MASK, count_markers
+from event_flags import EVENT_BITS, STAT_EVENTS
+from vector_simulate import EPOCH_YEARS, EVENT_CODES, INSTAKILL_EVENTS, HAZARD_EVENTS, VIKINGS_VARIANT, \
+    RUINED_VARIANT, get_step_ladder, select_event, get_variant_tables, get_batch_stats, get_knowledge_of_past, \
+    get_value_of_materials, state_of_tech
+from simulate import get_event_ladder, get_steps
+from hazards import HAZARD_MODEL
+
+@dataclass
+class WeightedResult:
+    """Importance-sampled breach estimates for one layout"""
+    trials: int
+    breach_probability: float = 0
+    standard_error: float = 0
+    breach_probabilities: dict = field(default_factory=dict) #fatal event name -> estimated probability
+    effective_trials: float = 0 #Kish effective sample size of the breached trials' weights
+
+    def survival_rate(self):
+        """Returns the estimated probability that the site is never breached"""
+        return 1 - self.breach_probability
+
+    def confidence_interval(self, z_score=1.96):
+        """Returns a (low, high) normal-approximation confidence interval on the breach probability"""
+        half_width = z_score * self.standard_error
+        return max(0, self.breach_probability - half_width), min(1, self.breach_probability + half_width)
+
+def get_default_tilt(years, epoch_years=EPOCH_YEARS):
+    """Returns the mixture weight that forces about one fatal die per trial over the horizon"""
+    return 1 / max(1, len(get_steps(years, epoch_years)) * (len(HAZARD_EVENTS) + 1))
+
+def get_fatal_ranges(ladder, size):
+    """Returns the (low, high) arrays of the die ranges in which an event ladder yields an instakill event"""
+    covered = np.zeros(size)
+    ranges = []
+    for name, condition, threshold in ladder:
+        active = np.broadcast_to(condition, (size,)) & (threshold > covered)
+        top = np.where(active, threshold, covered)
+        if name in INSTAKILL_EVENTS:
+            ranges.append((covered, top))
+        covered = top
+    return ranges
+
+def roll_tilted(rng, ranges, tilt):
+    """Draws one die per trial from the mixture (1-tilt)*uniform + tilt*uniform over the union of the fatal ranges.
+    Returns the dice and the likelihood ratio of each under a fair die. Trials with no fatal range roll fairly"""
+    size = len(ranges[0][0]) if ranges else 0
+    widths = [high - low for low, high in ranges]
+    total_width = np.sum(widths, axis=0) if ranges else np.zeros(size)
+    trial_tilt = np.where(total_width > 0, tilt, 0)
+    forced = rng.random(size) < trial_tilt
+    die = rng.random(size)
+    #map a uniform draw on [0, total_width) onto the fatal ranges in order
+    offset = rng.random(size) * total_width
+    forced_die = die.copy()
+    for (low, _), width in zip(ranges, widths):
+        lands = (offset >= 0) & (offset < width)
+        forced_die = np.where(lands, low + offset, forced_die)
+        offset = offset - width
+    die = np.where(forced, forced_die, die)
+
+    inside = np.zeros(size, dtype=bool)
+    for low, high in ranges:
+        inside |= (die >= low) & (die < high)
+    density = (1 - trial_tilt) + np.where(inside, trial_tilt / np.where(total_width > 0, total_width, 1), 0)
+    return die, 1 / density
+
+def simulate_importance(years, site_map, global_buffs, trials, rng=None, tilt=None, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments,too-many-locals
+    """Runs `trials` importance-sampled simulations of a layout, stepping epoch_years at a time as simulate.simulate
+    does, and returns a WeightedResult. tilt is the chance each instakill event die or hazard die is forced into its
+    fatal range, by default about one forced die per trial. Dice for states of tech and material values are rolled
+    fairly"""
+    if rng is None:
+        rng = np.random.default_rng()
+    if tilt is None:
+        tilt = get_default_tilt(years, epoch_years)
+    site_map = SiteMap.coerce(site_map)
+    tables = get_variant_tables([site_map])
+    buff_counts = count_markers(global_buffs)
+    num_monoliths = int(MONOLITH_MASK @ site_map.marker_counts())
+
+    variant = np.zeros(trials, dtype=np.int64)
+    flags = np.zeros(trials, dtype=np.int64)
+    weight = np.ones(trials)
+    cause = np.zeros(trials, dtype=np.int64) #0 while alive, otherwise 1 + index into fatal_events
+    fatal_events = INSTAKILL_EVENTS + HAZARD_EVENTS
+    live = np.arange(trials)
+
+    for current_year, step_years in get_steps(years, epoch_years):
+        if len(live) == 0:
+            break
+        size = len(live)
+
+        sot = state_of_tech(current_year, rng, size)
+        usability, visibility, respectability, likability, understandability = \
+            get_batch_stats(tables, buff_counts, current_year, sot, variant[live], flags[live])
+
+        ladder = get_event_ladder(current_year, sot, num_monoliths, respectability, global_buffs)
+        if step_years != EPOCH_YEARS:
+            ladder = get_step_ladder(ladder, step_years/EPOCH_YEARS)
+        die, ratio = roll_tilted(rng, get_fatal_ranges(ladder, size), tilt)
+        weight[live] *= ratio
+        event = select_event(ladder, die)
+        for name in STAT_EVENTS:
+            flags[live[event == EVENT_CODES[name]]] |= EVENT_BITS[name]
+        variant[live[event == EVENT_CODES["vikings"]]] |= VIKINGS_VARIANT
+        variant[live[(event == EVENT_CODES["earthquake"]) | (event == EVENT_CODES["faultline"])]] |= RUINED_VARIANT
+
+        alive = np.ones(size, dtype=bool)
+        for code, name in enumerate(INSTAKILL_EVENTS):
+            killed = event == EVENT_CODES[name]
+            cause[live[killed]] = code + 1
+            alive &= ~killed
+
+        kop = get_knowledge_of_past(visibility, respectability, likability, understandability)
+        vom = get_value_of_materials(current_year, rng, size)
+        value_die = rng.random(size)
+        probs = HAZARD_MODEL.get_batch_probabilities((kop, current_year-step_years, usability, visibility,
+                                                      respectability, sot, vom, value_die), understandability,
+                                                     step_years)
+        for hazard, prob in enumerate(probs):
+            #only trials still alive roll this hazard, so only their weights change
+            prob = np.clip(prob, 0, 1)
+            die, ratio = roll_tilted(rng, [(np.zeros(size), prob)], tilt)
+            weight[live[alive]] *= ratio[alive]
+            breached = alive & (die < prob)
+            cause[live[breached]] = len(INSTAKILL_EVENTS) + hazard + 1
+            alive &= ~breached
+        live = live[alive]
+
+    breach_weights = np.where(cause > 0, weight, 0)
+    result = WeightedResult(trials=trials, breach_probability=float(np.mean(breach_weights)))
+    if trials > 1:
+        result.standard_error = float(np.std(breach_weights, ddof=1) / math.sqrt(trials))
+    for code, name in enumerate(fatal_events):
+        estimate = float(np.sum(weight[cause == code+1]) / trials)
+        if estimate > 0:
+            result.breach_probabilities[name] = estimate
+    if np.any(breach_weights > 0):
+        result.effective_trials = float(np.sum(breach_weights)**2 / np.sum(breach_weights**2))
+    return result
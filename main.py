@@ -12,6 +12,7 @@ from player import Player
 from map import Map
 import marker
 import simulate
+from sink import ConsoleSink
 import button
 import tips
 
@@ -196,7 +197,8 @@ class App: #pylint: disable=too-many-instance-attributes
         if self.simulations_run < self.phase:
             self.latest_simulation_failed, event_log, map_log, death_margins, stats_list = simulate.simulate(self.phase*YEARS_IN_PHASE,
                                                                                             self.map.map,
-                                                                                            self.player.global_buffs)
+                                                                                            self.player.global_buffs,
+                                                                                            sink=ConsoleSink())
             print(death_margins)
             Map(death_margins).cells = []
             self.simulations_run += 1
@@ -466,4 +468,5 @@ class App: #pylint: disable=too-many-instance-attributes
         else: self.screen = Screen.SHOP
 
 
-App()
+if __name__ == "__main__":
+    App()
@@ -6,6 +6,8 @@ import button
 import marker
 from const import SCREEN_WIDTH, SCREEN_HEIGHT, ICON_WIDTH, ICON_HEIGHT, INVENTORY_BOX_BORDER_THICKNESS, NUM_INVENTORY_BOXES, NUM_SOCIETAL_BOXES
 from util import center_text
+from site_layout import MAP_ROWS, MAP_COLS, SPOOKY_BONUS, EDUCATIONAL_BONUS, SIGN_BONUS, BURIED_BONUS, TERRAFORMING_BONUS, \
+    MONOLITH_BONUS, get_blank_map, get_placement_bonuses, get_site_tiles
 
 MAP_BOTTOM_OFFSET=20
 MAP_INVENTORY_BOTTOM_MARGIN = ICON_HEIGHT*4
@@ -13,10 +15,20 @@ SOCIETAL_MODIFIER_WIDTH=80
 INVENTORY_WIDTH=SCREEN_WIDTH-SOCIETAL_MODIFIER_WIDTH
 CENTER_POINT_OF_CORE_X=112
 CENTER_POINT_OF_CORE_Y=96
+VIEW_ROWS = MAP_ROWS #tiles visible at once; larger maps scroll with the arrow keys
+VIEW_COLS = MAP_COLS
+
+#border colors outlining each kind of adjacency bonus
+BONUS_COLORS = {SPOOKY_BONUS: pyxel.COLOR_RED,
+                EDUCATIONAL_BONUS: pyxel.COLOR_GREEN,
+                SIGN_BONUS: pyxel.COLOR_BLACK,
+                BURIED_BONUS: pyxel.COLOR_DARKBLUE,
+                TERRAFORMING_BONUS: pyxel.COLOR_PURPLE,
+                MONOLITH_BONUS: pyxel.COLOR_LIGHTBLUE}
 
 class Map: #pylint: disable=too-many-instance-attributes
     """A class representing the map of the waste site, including the placement of markers"""
-    def __init__(self, death_margins):
+    def __init__(self, death_margins, rows=MAP_ROWS, cols=MAP_COLS):
         global cells
         cells = []
         self.selected_col = None
@@ -27,20 +39,9 @@ class Map: #pylint: disable=too-many-instance-attributes
         self.coords_for_bonuses = [] #hold a tuple - x coord, y coord, and color for border
         self.show_directions = False
 
-        self.map = [
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "site", "site", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "site", "site", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"],
-        ["null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null", "null"]
-        ]
+        self.map = get_blank_map(rows, cols)
+        self.view_row = 0 #top left tile of the visible part of the map
+        self.view_col = 0
 
         self.simulate_button = button.Button(
             x_coord=SCREEN_WIDTH - 45,
@@ -169,12 +170,25 @@ class Map: #pylint: disable=too-many-instance-attributes
                            allowable_core_distance= visitor_radius_list[j])
             cells.append(visitor)
 
+    def scroll(self, row_offset, col_offset):
+        """Moves the visible part of the map, keeping it on the map"""
+        self.view_row = max(0, min(self.view_row + row_offset, len(self.map) - VIEW_ROWS))
+        self.view_col = max(0, min(self.view_col + col_offset, len(self.map[0]) - VIEW_COLS))
+
     def update(self, player, is_simulation=False):
         """Updates the map state"""
         if not is_simulation: #pylint: disable=too-many-nested-blocks
+            if pyxel.btnp(pyxel.KEY_UP, 10, 2):
+                self.scroll(-1, 0)
+            if pyxel.btnp(pyxel.KEY_DOWN, 10, 2):
+                self.scroll(1, 0)
+            if pyxel.btnp(pyxel.KEY_LEFT, 10, 2):
+                self.scroll(0, -1)
+            if pyxel.btnp(pyxel.KEY_RIGHT, 10, 2):
+                self.scroll(0, 1)
             if pyxel.btnp(pyxel.MOUSE_LEFT_BUTTON): #get the selected square
-                self.selected_col = int(pyxel.mouse_x/16)
-                self.selected_row = int(pyxel.mouse_y/16)
+                self.selected_col = int(pyxel.mouse_x/16) + self.view_col
+                self.selected_row = int(pyxel.mouse_y/16) + self.view_row
 
                 inventory_y_coord = SCREEN_HEIGHT-MAP_INVENTORY_BOTTOM_MARGIN
                 if self.selected_inventory_item is None:
@@ -203,40 +217,11 @@ class Map: #pylint: disable=too-many-instance-attributes
                             self.map[self.selected_row][self.selected_col] = self.selected_inventory_item #update self.map
 
                             ###ADJACENCY BONUSES!!!!!!!!!!
-                            for row in range (-1,2):
-                                for col in range(-1,2):
-                                    #check for out of bounds
-                                    if self.selected_col+col < 16 and self.selected_col+col > -1 and self.selected_row+row < 12 and self.selected_row+row > -1 and ((row==0 and col==0) is False): 
-                                        #check that there's a defense adjacent to current item
-                                        if self.map[self.selected_row+row][self.selected_col+col] != "null" and self.map[self.selected_row+row][self.selected_col+col] != "site":
-                                            #RED border for SPOOKY
-                                            if "spooky" in marker.markers[self.selected_inventory_item].tags and "spooky" in marker.markers[self.map[self.selected_row+row][self.selected_col+col]].tags:
-                                                self.coords_for_bonuses.append([self.selected_col*ICON_WIDTH, self.selected_row*ICON_HEIGHT, pyxel.COLOR_RED])
-                                                self.coords_for_bonuses.append([(self.selected_col+col)*ICON_WIDTH, (self.selected_row+row)*ICON_HEIGHT, pyxel.COLOR_RED])
-                                            #GREEN border for placing "pro-educational" things next to "educational" things
-                                            if ("pro-educational" in marker.markers[self.selected_inventory_item].tags and "educational" in marker.markers[self.map[self.selected_row+row][self.selected_col+col]].tags) \
-                                            or ("educational" in marker.markers[self.selected_inventory_item].tags and "pro-educational" in marker.markers[self.map[self.selected_row+row][self.selected_col+col]].tags):
-                                                self.coords_for_bonuses.append([self.selected_col*ICON_WIDTH, self.selected_row*ICON_HEIGHT, pyxel.COLOR_GREEN])
-                                                self.coords_for_bonuses.append([(self.selected_col+col)*ICON_WIDTH, (self.selected_row+row)*ICON_HEIGHT, pyxel.COLOR_GREEN])
-                                            #BLACK border for danger signs and disgust faces next to each other
-                                            if self.selected_inventory_item=="danger-sign" and self.map[self.selected_row+row][self.selected_col+col]=="disgust-faces" \
-                                            or self.selected_inventory_item=="disgust-faces" and self.map[self.selected_row+row][self.selected_col+col]=="danger-sign":
-                                                self.coords_for_bonuses.append([self.selected_col*ICON_WIDTH, self.selected_row*ICON_HEIGHT, pyxel.COLOR_BLACK])
-                                                self.coords_for_bonuses.append([(self.selected_col+col)*ICON_WIDTH, (self.selected_row+row)*ICON_HEIGHT, pyxel.COLOR_BLACK])
-                                            #DARKBLUE border for buried magnets and menacing earthworks next to each other
-                                            if self.selected_inventory_item=="buried-magnets" and self.map[self.selected_row+row][self.selected_col+col]=="menacing-earthworks" \
-                                            or self.selected_inventory_item=="menacing-earthworks" and self.map[self.selected_row+row][self.selected_col+col]=="buried-magnets":
-                                                self.coords_for_bonuses.append([self.selected_col*ICON_WIDTH, self.selected_row*ICON_HEIGHT, pyxel.COLOR_DARKBLUE])
-                                                self.coords_for_bonuses.append([(self.selected_col+col)*ICON_WIDTH, (self.selected_row+row)*ICON_HEIGHT, pyxel.COLOR_DARKBLUE])
-                                            #PURPLE border for the same terraforming objects
-                                            if "terraforming" in marker.markers[self.selected_inventory_item].tags and "terraforming" in marker.markers[self.map[self.selected_row+row][self.selected_col+col]].tags \
-                                            and self.map[self.selected_row+row][self.selected_col+col] == self.selected_inventory_item:
-                                                self.coords_for_bonuses.append([self.selected_col*ICON_WIDTH, self.selected_row*ICON_HEIGHT, pyxel.COLOR_PURPLE])
-                                                self.coords_for_bonuses.append([(self.selected_col+col)*ICON_WIDTH, (self.selected_row+row)*ICON_HEIGHT, pyxel.COLOR_PURPLE])
-                                            #LIGHTBLUE border for monoliths
-                                            if "monolith" in marker.markers[self.selected_inventory_item].tags and "monolith" in marker.markers[self.map[self.selected_row+row][self.selected_col+col]].tags:
-                                                self.coords_for_bonuses.append([self.selected_col*ICON_WIDTH, self.selected_row*ICON_HEIGHT, pyxel.COLOR_LIGHTBLUE])
-                                                self.coords_for_bonuses.append([(self.selected_col+col)*ICON_WIDTH, (self.selected_row+row)*ICON_HEIGHT, pyxel.COLOR_LIGHTBLUE])
+                            for neighbor_row, neighbor_col, bonus in get_placement_bonuses(self.map, self.selected_row,
+                                                                                           self.selected_col,
+                                                                                           self.selected_inventory_item):
+                                self.coords_for_bonuses.append([self.selected_col*ICON_WIDTH, self.selected_row*ICON_HEIGHT, BONUS_COLORS[bonus]])
+                                self.coords_for_bonuses.append([neighbor_col*ICON_WIDTH, neighbor_row*ICON_HEIGHT, BONUS_COLORS[bonus]])
                             self.clicked_inven = None
                             self.selected_inventory_item = None
         else:
@@ -247,17 +232,18 @@ class Map: #pylint: disable=too-many-instance-attributes
     def draw(self, player, is_simulation=False):
         """Draws map to the screen"""
         pyxel.bltm(0, 0, 7, 0, 232, 32, 24)
-        pyxel.blt(SCREEN_WIDTH/2 - 32, 80, 1, 0, 128, 64,48,4)
-        for row in range(12): #draw the terrain
-            for col in range(16):
+        site_row, site_col = get_site_tiles(len(self.map), len(self.map[0]))[0]
+        pyxel.blt((site_col - self.view_col - 1)*16, (site_row - self.view_row)*16, 1, 0, 128, 64,48,4)
+        for row in range(self.view_row, min(self.view_row + VIEW_ROWS, len(self.map))): #draw the visible terrain
+            for col in range(self.view_col, min(self.view_col + VIEW_COLS, len(self.map[row]))):
                 if self.map[row][col] != "null" and self.map[row][col] != "site":
-                    pyxel.blt(col*16, row*16, marker.markers[self.map[row][col]].icon_image,
+                    pyxel.blt((col - self.view_col)*16, (row - self.view_row)*16, marker.markers[self.map[row][col]].icon_image,
                               marker.markers[self.map[row][col]].icon_coords[0],
                               marker.markers[self.map[row][col]].icon_coords[1], ICON_WIDTH, ICON_HEIGHT, 0)
 
         #DRAW BORDERS TO SHOW ADJACENCY BONUSES
         for elem in self.coords_for_bonuses: 
-            pyxel.rectb(elem[0], elem[1], ICON_WIDTH, ICON_HEIGHT, elem[2])
+            pyxel.rectb(elem[0] - self.view_col*ICON_WIDTH, elem[1] - self.view_row*ICON_HEIGHT, ICON_WIDTH, ICON_HEIGHT, elem[2])
 
         if not is_simulation:
             self.simulate_button.draw()
@@ -0,0 +1,121 @@
+"""Compiles marker.markers once at import into integer-indexed NumPy arrays, so that the stats of every marker can be
+evaluated for a given year in one array operation"""
+
+from functools import lru_cache
+import math
+import numpy as np
+from marker import markers, get_marker_keys
+
+MARKER_KEYS = tuple(get_marker_keys())
+MARKER_INDEX = {key: index for index, key in enumerate(MARKER_KEYS)}
+
+#stat order used throughout simulate.py
+STAT_NAMES = ("usability", "visibility", "respectability", "likability", "understandability")
+USABILITY, VISIBILITY, RESPECTABILITY, LIKABILITY, UNDERSTANDABILITY = range(len(STAT_NAMES))
+
+DECAY_KINDS = ("constant", "slow_lin_0", "lin_0", "fast_lin_0", "slow_lin_inc_8", "slow_lin_inc_3", "exp_0",
+               "exp_neg_10", "tech_curve")
+DECAY_INDEX = {kind: index for index, kind in enumerate(DECAY_KINDS)}
+
+#init values by [marker, stat, state of tech]
+INITS = np.array([[getattr(markers[key], stat + "_init") for stat in STAT_NAMES] for key in MARKER_KEYS],
+                 dtype=float)
+#decay kind by [marker, stat]
+DECAYS = np.array([[DECAY_INDEX[getattr(markers[key], stat + "_decay")] for stat in STAT_NAMES]
+                   for key in MARKER_KEYS])
+
+def get_tag_mask(tag):
+    """Returns a boolean array which is true for every marker with the given tag"""
+    return np.array([tag in markers[key].tags for key in MARKER_KEYS])
+
+SPOOKY_MASK = get_tag_mask("spooky")
+LINGUISTIC_MASK = get_tag_mask("linguistic")
+PICTORAL_OR_LINGUISTIC_MASK = LINGUISTIC_MASK | get_tag_mask("pictoral")
+BURIED_MASK = get_tag_mask("buried")
+TERRAFORMING_MASK = get_tag_mask("terraforming")
+MONOLITH_MASK = get_tag_mask("monolith")
+
+def get_decay_kernels(current_year, sot):
+    """Returns per-decay-kind (offset, scale, shift) arrays such that a decayed stat is (init+offset)*scale+shift"""
+    years_elapsed = current_year-2000
+    offset = np.zeros(len(DECAY_KINDS))
+    scale = np.ones(len(DECAY_KINDS))
+    shift = np.zeros(len(DECAY_KINDS))
+    shift[DECAY_INDEX["slow_lin_0"]] = -.0008*years_elapsed
+    shift[DECAY_INDEX["lin_0"]] = -.002*years_elapsed
+    shift[DECAY_INDEX["fast_lin_0"]] = -.005*years_elapsed
+    shift[DECAY_INDEX["slow_lin_inc_8"]] = .0002*years_elapsed
+    shift[DECAY_INDEX["slow_lin_inc_3"]] = .0003*years_elapsed
+    scale[DECAY_INDEX["exp_0"]] = math.exp(-.001*years_elapsed)
+    offset[DECAY_INDEX["exp_neg_10"]] = 10
+    scale[DECAY_INDEX["exp_neg_10"]] = math.exp(-.001*years_elapsed)
+    shift[DECAY_INDEX["exp_neg_10"]] = -10
+    if sot == 0:
+        offset[DECAY_INDEX["tech_curve"]] = 5
+        scale[DECAY_INDEX["tech_curve"]] = math.exp(-.005*years_elapsed)
+        shift[DECAY_INDEX["tech_curve"]] = -5
+    else:
+        shift[DECAY_INDEX["tech_curve"]] = .0005*years_elapsed
+    return offset, scale, shift
+
+def get_decay_kernels_for_years(years, sot):
+    """get_decay_kernels for an array of years at once. Returns (years, decay kinds) offset, scale and shift arrays"""
+    years_elapsed = np.asarray(years, dtype=float)[:, None]-2000
+    offset = np.zeros((len(years_elapsed), len(DECAY_KINDS)))
+    scale = np.ones((len(years_elapsed), len(DECAY_KINDS)))
+    shift = np.zeros((len(years_elapsed), len(DECAY_KINDS)))
+    shift[:, [DECAY_INDEX["slow_lin_0"]]] = -.0008*years_elapsed
+    shift[:, [DECAY_INDEX["lin_0"]]] = -.002*years_elapsed
+    shift[:, [DECAY_INDEX["fast_lin_0"]]] = -.005*years_elapsed
+    shift[:, [DECAY_INDEX["slow_lin_inc_8"]]] = .0002*years_elapsed
+    shift[:, [DECAY_INDEX["slow_lin_inc_3"]]] = .0003*years_elapsed
+    scale[:, [DECAY_INDEX["exp_0"]]] = np.exp(-.001*years_elapsed)
+    offset[:, DECAY_INDEX["exp_neg_10"]] = 10
+    scale[:, [DECAY_INDEX["exp_neg_10"]]] = np.exp(-.001*years_elapsed)
+    shift[:, DECAY_INDEX["exp_neg_10"]] = -10
+    if sot == 0:
+        offset[:, DECAY_INDEX["tech_curve"]] = 5
+        scale[:, [DECAY_INDEX["tech_curve"]]] = np.exp(-.005*years_elapsed)
+        shift[:, DECAY_INDEX["tech_curve"]] = -5
+    else:
+        shift[:, [DECAY_INDEX["tech_curve"]]] = .0005*years_elapsed
+    return offset, scale, shift
+
+def get_event_inits(sot, klingon, turtle, goths, faultline):
+    """Returns a (markers, 5) array of every marker's undecayed stats at a state of technology, adjusted for the
+    events that modify marker stats"""
+    inits = INITS[:, :, sot].copy()
+    #very special case for goth event - flip likability for spoopy stuff
+    if goths:
+        inits[SPOOKY_MASK, LIKABILITY] *= -1
+    #special case for klingon event: understandability down
+    if klingon:
+        inits[LINGUISTIC_MASK, UNDERSTANDABILITY] *= .5
+    #special case for turtles! understandability down for more stuff
+    if turtle:
+        inits[PICTORAL_OR_LINGUISTIC_MASK, UNDERSTANDABILITY] *= .7
+    #faultline: vis up for buried markers
+    if faultline:
+        inits[BURIED_MASK, VISIBILITY] *= 2
+    return inits
+
+@lru_cache(maxsize=4096)
+def get_marker_stats(current_year, sot, klingon, turtle, goths, faultline): #pylint: disable=too-many-arguments
+    """Returns a read-only (markers, 5) array of every marker's stats, adjusted for decay, state of technology and
+    the events that modify marker stats"""
+    inits = get_event_inits(sot, klingon, turtle, goths, faultline)
+    offset, scale, shift = get_decay_kernels(current_year, sot)
+    stats = (inits + offset[DECAYS])*scale[DECAYS] + shift[DECAYS]
+    stats.flags.writeable = False
+    return stats
+
+def get_marker_stats_for_years(years, sot, klingon, turtle, goths, faultline): #pylint: disable=too-many-arguments
+    """get_marker_stats for an array of years at once. Returns a (years, markers, 5) array"""
+    inits = get_event_inits(sot, klingon, turtle, goths, faultline)
+    offset, scale, shift = get_decay_kernels_for_years(years, sot)
+    return (inits + offset[:, DECAYS])*scale[:, DECAYS] + shift[:, DECAYS]
+
+def count_markers(marker_ids):
+    """Returns how many times each marker appears in a list of marker ids, indexed by marker code"""
+    codes = np.array([MARKER_INDEX[marker_id] for marker_id in marker_ids], dtype=np.int64)
+    return np.bincount(codes, minlength=len(MARKER_KEYS))
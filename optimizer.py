@@ -0,0 +1,157 @@
+"""Searches marker placements for a site layout with simulated annealing. Each step proposes a batch of swap, move and
+replace moves from the current layout and scores them in parallel with batched Monte Carlo trials"""
+
+import heapq
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np
+from site_grid import SiteMap
+from marker_table import MARKER_INDEX
+from vector_simulate import simulate_layouts
+from streams import new_root_seed
+
+OPEN_TILE = "null"
+FIXED_TILES = ("site",) #tiles the search never changes
+MOVES = ("swap", "move", "replace")
+
+@dataclass(frozen=True)
+class Candidate:
+    """A layout under search: the site map and the inventory markers that are not placed on it"""
+    site_map: SiteMap
+    unplaced: tuple = ()
+
+@dataclass(order=True)
+class ScoredLayout:
+    """A layout and its estimated survival rate"""
+    survival: float
+    candidate: Candidate = field(compare=False)
+
+@dataclass
+class OptimizerResult:
+    """The best layouts an optimizer run found, best first"""
+    best: list
+    evaluated: int = 0 #number of candidate layouts scored
+    elapsed: float = 0 #seconds
+
+    def candidates_per_minute(self):
+        """Returns how many candidate layouts were scored per minute"""
+        if self.elapsed == 0:
+            return 0
+        return self.evaluated * 60 / self.elapsed
+
+def get_open_tiles(codes):
+    """Returns the (row, col) of every empty tile"""
+    return list(zip(*np.nonzero(codes == MARKER_INDEX[OPEN_TILE])))
+
+def get_placed_tiles(codes):
+    """Returns the (row, col) of every tile holding a marker the search may move"""
+    movable = codes != MARKER_INDEX[OPEN_TILE]
+    for tile in FIXED_TILES:
+        movable &= codes != MARKER_INDEX[tile]
+    return list(zip(*np.nonzero(movable)))
+
+def propose_move(candidate, rng):
+    """Returns a random neighbor of a candidate, or the candidate itself if the chosen move is impossible.
+    swap exchanges two placed markers, move shifts a placed marker onto an empty tile and replace exchanges a tile
+    with an unplaced inventory marker, placing, removing or swapping out a marker"""
+    codes = candidate.site_map.codes.copy()
+    unplaced = list(candidate.unplaced)
+    placed = get_placed_tiles(codes)
+    move = rng.choice(MOVES)
+    if move == "swap" and len(placed) >= 2:
+        first, second = rng.sample(placed, 2)
+        codes[first], codes[second] = codes[second], codes[first]
+    elif move == "move" and placed:
+        open_tiles = get_open_tiles(codes)
+        if not open_tiles:
+            return candidate
+        source, target = rng.choice(placed), rng.choice(open_tiles)
+        codes[source], codes[target] = codes[target], codes[source]
+    elif move == "replace":
+        tiles = placed + get_open_tiles(codes)
+        if not tiles:
+            return candidate
+        tile = rng.choice(tiles)
+        old_marker = candidate.site_map[tile[0]][tile[1]]
+        new_marker = rng.choice(unplaced + [OPEN_TILE])
+        if new_marker == old_marker:
+            return candidate
+        if new_marker != OPEN_TILE:
+            unplaced.remove(new_marker)
+        if old_marker != OPEN_TILE:
+            unplaced.append(old_marker)
+        codes[tile] = MARKER_INDEX[new_marker]
+    else:
+        return candidate
+    return Candidate(SiteMap(codes), tuple(sorted(unplaced)))
+
+def score_candidates(candidates, global_buffs, years, trials, seed): #pylint: disable=too-many-arguments
+    """Returns the estimated survival rate of each candidate. Trial k of every candidate rolls the same dice for a
+    given seed, so differences between candidates are not drowned out by sampling noise, even across workers"""
+    results = simulate_layouts(years, [candidate.site_map for candidate in candidates], global_buffs, trials,
+                               np.random.default_rng(seed))
+    return [result.survival_rate() for result in results]
+
+def split_candidates(candidates, chunks):
+    """Splits a list of candidates into at most `chunks` contiguous, near-equal parts"""
+    chunks = max(1, min(chunks, len(candidates)))
+    base, extra = divmod(len(candidates), chunks)
+    parts = []
+    start = 0
+    for i in range(chunks):
+        end = start + base + (1 if i < extra else 0)
+        parts.append(candidates[start:end])
+        start = end
+    return parts
+
+def optimize_layout(site_map, inventory, global_buffs, years=10000, steps=200, batch_size=64, trials=200, #pylint: disable=too-many-arguments,too-many-locals
+                    workers=None, seed=None, start_temperature=.02, end_temperature=.0005, keep=5):
+    """Anneals the placement of the inventory markers on a site map and returns an OptimizerResult holding the
+    `keep` best distinct layouts found. Markers already on the map may be moved or taken off too. Each step
+    scores batch_size moves from the current layout with `trials` Monte Carlo trials each, spread over workers
+    (the number of CPUs by default), and moves to the best of them by the Metropolis rule"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if seed is None:
+        seed = new_root_seed()
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    current = Candidate(SiteMap.coerce(site_map), tuple(sorted(inventory)))
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def score(candidates, step_seed):
+        if pool is None:
+            return score_candidates(candidates, global_buffs, years, trials, step_seed)
+        futures = [pool.submit(score_candidates, part, global_buffs, years, trials, step_seed)
+                   for part in split_candidates(candidates, workers)]
+        return [survival for future in futures for survival in future.result()]
+
+    try:
+        current_survival = score([current], seed)[0]
+        evaluated = 1
+        best = {current.site_map: ScoredLayout(current_survival, current)}
+        for step in range(steps):
+            temperature = start_temperature * (end_temperature/start_temperature) ** (step/max(1, steps-1))
+            proposals = list({proposal.site_map: proposal for proposal in
+                              (propose_move(current, rng) for _ in range(batch_size))}.values())
+            #rescore the current layout on the same stream so it competes on equal terms
+            survivals = score([current] + proposals, seed + step + 1)
+            evaluated += len(survivals)
+            current_survival = survivals[0]
+            for proposal, survival in zip(proposals, survivals[1:]):
+                if proposal.site_map not in best or best[proposal.site_map].survival < survival:
+                    best[proposal.site_map] = ScoredLayout(survival, proposal)
+            top_survival, top_proposal = max(zip(survivals[1:], proposals), key=lambda pair: pair[0])
+            if top_survival >= current_survival or \
+                    rng.random() < math.exp((top_survival-current_survival)/temperature):
+                current = top_proposal
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return OptimizerResult(best=heapq.nlargest(keep, best.values()), evaluated=evaluated,
+                           elapsed=time.perf_counter()-start)
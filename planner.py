@@ -0,0 +1,98 @@
+"""Plans shop purchases. Enumerates the bundles of shelf markers the player can afford and has room for, and ranks
+them by the estimated survival of the site once they are in use. Shelves can be any objects with marker_on_shelf,
+sticker_price and is_sold attributes, so planning does not need the shop screen or pyxel"""
+
+from dataclasses import dataclass, field
+import numpy as np
+from marker import markers
+from marker_table import MARKER_INDEX
+from const import NUM_INVENTORY_BOXES, NUM_SOCIETAL_BOXES
+from site_grid import SiteMap
+from vector_simulate import simulate_layouts
+from streams import new_root_seed
+
+OPEN_TILE = "null"
+SITE_TILE = "site"
+
+@dataclass(order=True)
+class PurchaseBundle:
+    """A set of shelves to buy from, with its estimated survival rate"""
+    survival: float
+    cost: int = field(compare=False)
+    shelves: tuple = field(compare=False) #indices into the shelves passed to plan_purchases
+    markers: tuple = field(compare=False)
+
+def get_affordable_bundles(shelves, funding, inventory_room, societal_room):
+    """Returns every set of unsold shelf indices whose total price is within funding and whose markers fit in the
+    free inventory and societal boxes, including the empty set"""
+    for_sale = [index for index, shelf in enumerate(shelves) if not shelf.is_sold]
+    bundles = []
+
+    def extend(start, bundle, spent, inventory_left, societal_left):
+        bundles.append(tuple(bundle))
+        for position in range(start, len(for_sale)):
+            shelf = shelves[for_sale[position]]
+            is_global = markers[shelf.marker_on_shelf].is_global()
+            if spent + shelf.sticker_price > funding or (societal_left if is_global else inventory_left) <= 0:
+                continue
+            bundle.append(for_sale[position])
+            extend(position+1, bundle, spent + shelf.sticker_price, inventory_left - (not is_global),
+                   societal_left - is_global)
+            bundle.pop()
+
+    extend(0, [], 0, inventory_room, societal_room)
+    return bundles
+
+def get_placement_order(site_map):
+    """Returns the open tiles of a site map from nearest to farthest from the site, ties broken by row then column"""
+    codes = site_map.codes
+    rows, cols = np.indices(codes.shape)
+    site_rows, site_cols = np.nonzero(codes == MARKER_INDEX[SITE_TILE])
+    if len(site_rows) == 0:
+        distance = np.zeros(codes.shape, dtype=np.int64)
+    else:
+        distance = np.min(np.maximum(np.abs(rows[..., None] - site_rows), np.abs(cols[..., None] - site_cols)),
+                          axis=-1)
+    open_rows, open_cols = np.nonzero(codes == MARKER_INDEX[OPEN_TILE])
+    order = np.lexsort((open_cols, open_rows, distance[open_rows, open_cols]))
+    return list(zip(open_rows[order].tolist(), open_cols[order].tolist()))
+
+def place_markers(site_map, marker_ids):
+    """Returns a copy of the site map with the markers placed on the open tiles nearest the site, in order. Markers
+    that do not fit are left off"""
+    site_map = SiteMap.coerce(site_map)
+    codes = site_map.codes.copy()
+    for (row_num, col_num), marker_id in zip(get_placement_order(site_map), marker_ids):
+        codes[row_num, col_num] = MARKER_INDEX[marker_id]
+    return SiteMap(codes)
+
+def plan_purchases(shelves, inventory, global_buffs, funding, site_map, years=10000, trials=400, seed=None): #pylint: disable=too-many-arguments,too-many-locals
+    """Returns every affordable PurchaseBundle, best estimated survival first and cheapest first among ties. Each
+    bundle is scored by placing the player's inventory and the bundle's placeable markers next to the site and
+    simulating `trials` trials with global_buffs plus the bundle's global markers. All bundles roll the same dice,
+    so their ranking is not swayed by sampling noise"""
+    if seed is None:
+        seed = new_root_seed()
+    site_map = SiteMap.coerce(site_map)
+    bundles = get_affordable_bundles(shelves, funding, max(0, NUM_INVENTORY_BOXES - len(inventory)),
+                                     max(0, NUM_SOCIETAL_BOXES - len(global_buffs)))
+
+    #bundles with the same global markers can be simulated together
+    groups = {}
+    for bundle in bundles:
+        bought = [shelves[index].marker_on_shelf for index in bundle]
+        bundle_buffs = tuple(global_buffs) + tuple(marker_id for marker_id in bought if markers[marker_id].is_global())
+        placed = place_markers(site_map, list(inventory) + [marker_id for marker_id in bought
+                                                            if not markers[marker_id].is_global()])
+        groups.setdefault(bundle_buffs, []).append((bundle, bought, placed))
+
+    ranked = []
+    for bundle_buffs, members in groups.items():
+        results = simulate_layouts(years, [placed for _, _, placed in members], list(bundle_buffs), trials,
+                                   np.random.default_rng(seed))
+        for (bundle, bought, _), result in zip(members, results):
+            ranked.append(PurchaseBundle(survival=result.survival_rate(),
+                                         cost=sum(shelves[index].sticker_price for index in bundle),
+                                         shelves=bundle, markers=tuple(bought)))
+    ranked.sort(key=lambda bundle: (-bundle.survival, bundle.cost))
+    return ranked
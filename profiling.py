@@ -0,0 +1,70 @@
+"""Defines SimulationProfile, the per-phase wall times and call counts simulate.simulate records when asked to profile
+a run"""
+
+import time
+from dataclasses import dataclass, field
+
+#adjacency is timed inside get_stats, so its time is also counted in get_stats
+PHASES = ("state_of_tech", "get_stats", "adjacency", "get_random_event", "hazards", "get_modified_map")
+
+@dataclass
+class PhaseTiming:
+    """Total wall time of every call to one phase"""
+    calls: int = 0
+    seconds: float = 0
+
+    def merge(self, other):
+        """Adds another timing of the same phase into this one"""
+        self.calls += other.calls
+        self.seconds += other.seconds
+
+@dataclass
+class EpochProfile:
+    """Wall time spent in each phase during one epoch"""
+    year: int
+    phases: dict = field(default_factory=dict) #phase -> PhaseTiming
+
+@dataclass
+class SimulationProfile:
+    """Where the time of one or more simulate.simulate runs went, per phase and per epoch"""
+    phases: dict = field(default_factory=lambda: {phase: PhaseTiming() for phase in PHASES})
+    epochs: list = field(default_factory=list) #EpochProfile per epoch, in order
+    runs: int = 0
+    seconds: float = 0 #total wall time of the runs
+
+    def start_epoch(self, year):
+        """Starts attributing phase times to a new epoch"""
+        self.epochs.append(EpochProfile(year))
+
+    def record(self, phase, start):
+        """Adds the time since `start`, a time.perf_counter() reading, to a phase and the current epoch"""
+        seconds = time.perf_counter() - start
+        self.phases[phase].calls += 1
+        self.phases[phase].seconds += seconds
+        if self.epochs:
+            self.epochs[-1].phases.setdefault(phase, PhaseTiming()).merge(PhaseTiming(1, seconds))
+
+    def merge(self, other):
+        """Adds another profile into this one. Epochs are matched by year, so merged trials of the same horizon
+        line up"""
+        for phase, timing in other.phases.items():
+            self.phases.setdefault(phase, PhaseTiming()).merge(timing)
+        epochs_by_year = {epoch.year: epoch for epoch in self.epochs}
+        for epoch in other.epochs:
+            if epoch.year not in epochs_by_year:
+                epochs_by_year[epoch.year] = EpochProfile(epoch.year)
+                self.epochs.append(epochs_by_year[epoch.year])
+            for phase, timing in epoch.phases.items():
+                epochs_by_year[epoch.year].phases.setdefault(phase, PhaseTiming()).merge(timing)
+        self.epochs.sort(key=lambda epoch: epoch.year)
+        self.runs += other.runs
+        self.seconds += other.seconds
+
+    def format(self):
+        """Returns the per-phase totals as a table, slowest phase first"""
+        lines = [f"{'phase':<20}{'calls':>9}{'seconds':>12}{'share':>8}"]
+        for phase, timing in sorted(self.phases.items(), key=lambda item: -item[1].seconds):
+            share = timing.seconds / self.seconds if self.seconds else 0
+            lines.append(f"{phase:<20}{timing.calls:>9}{timing.seconds:>12.6f}{share:>8.1%}")
+        lines.append(f"{'total':<20}{self.runs:>9}{self.seconds:>12.6f}")
+        return "\n".join(lines)
@@ -0,0 +1,138 @@
+"""Caches the aggregate results of simulating a layout in a local SQLite file, so layouts re-simulated across sweeps,
+optimizer restarts and game sessions are only run once. Entries are keyed by a hash of the canonical layout, the
+global buffs, the horizon, the trial count, the epoch length and the simulation model's version, and the least
+recently used entries are evicted once the cache outgrows its size cap"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from functools import lru_cache
+import numpy as np
+from site_grid import SiteMap, SparseSiteMap
+from marker_table import MARKER_INDEX, MARKER_KEYS
+from batch import simulate_many
+from simulate import EPOCH_YEARS
+from result_store import ResultSummary
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "not-honor", "results.sqlite")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+FIXED_TILES = ("site",) #tiles a symmetry must leave in place
+
+#modules whose code decides a layout's simulated outcome; editing any of them changes the model version
+MODEL_MODULES = ("simulate", "hazards", "marker", "marker_table", "event", "event_flags", "adjacency", "site_grid",
+                 "batch", "streams", "vector_simulate")
+
+@lru_cache(maxsize=None)
+def get_model_version():
+    """Returns a hash of the source of the simulation model's modules. Computed once per process"""
+    digest = hashlib.sha256()
+    for name in MODEL_MODULES:
+        __import__(name)
+        with open(sys.modules[name].__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+def get_symmetries(codes):
+    """Returns every mirror image and half turn of a code grid that leaves the fixed tiles where they are,
+    including the grid itself. Every adjacency bonus counts neighbor pairs or contiguous blocks, so each of these
+    images has the same stats as the original"""
+    fixed_codes = [MARKER_INDEX[tile] for tile in FIXED_TILES]
+    fixed = np.isin(codes, fixed_codes)
+    images = []
+    for image in (codes, codes[:, ::-1], codes[::-1, :], codes[::-1, ::-1]):
+        if np.array_equal(np.isin(image, fixed_codes), fixed):
+            images.append(image)
+    return images
+
+def canonicalize(site_map):
+    """Returns the SiteMap of the symmetry of a layout whose codes sort first. Sparse maps are made dense first"""
+    if isinstance(site_map, SparseSiteMap):
+        site_map = site_map.to_dense()
+    images = get_symmetries(SiteMap.coerce(site_map).codes)
+    return SiteMap(min(images, key=lambda image: image.tobytes()))
+
+def get_cache_key(site_map, global_buffs, years, trials, model_version=None, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Returns the cache key of a simulation run"""
+    codes = canonicalize(site_map).codes
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"shape": codes.shape, "markers": len(MARKER_KEYS), "buffs": sorted(global_buffs),
+                              "years": years, "epoch_years": epoch_years, "trials": trials,
+                              "model": model_version or get_model_version()}).encode())
+    digest.update(codes.tobytes())
+    return digest.hexdigest()
+
+class ResultCache:
+    """A size-capped on-disk map from cache keys to ResultSummary aggregates. Use as a context manager, or call
+    close() when done"""
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                                "size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.connection.commit()
+
+    def get(self, key):
+        """Returns the ResultSummary stored under a key, marking it recently used, or None on a miss"""
+        row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+        return ResultSummary.from_json(json.loads(row[0]))
+
+    def put(self, key, summary):
+        """Stores a ResultSummary under a key, then evicts least recently used entries until the cache fits"""
+        value = json.dumps(summary.to_json())
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                (key, value, len(value), time.time()))
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """Deletes least recently used entries until the total size is within the cap"""
+        excess = self.get_size() - self.max_bytes
+        if excess <= 0:
+            return
+        doomed = []
+        for key, size in self.connection.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        self.connection.executemany("DELETE FROM results WHERE key = ?", doomed)
+
+    def get_size(self):
+        """Returns the total size of the stored values in bytes"""
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        """Closes the cache file"""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def simulate_cached(cache, layout, buffs, years, trials, workers=None, seed=None, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Returns the ResultSummary of `trials` simulations of a layout, from the cache if any symmetry of it has been
+    run before with the same buffs, horizon, trial count and epoch length, otherwise by running batch.simulate_many
+    and storing the result"""
+    key = get_cache_key(layout, buffs, years, trials, epoch_years=epoch_years)
+    summary = cache.get(key)
+    if summary is None:
+        summary = ResultSummary.from_batch(simulate_many(canonicalize(layout), buffs, years, trials, workers, seed,
+                                                         epoch_years))
+        cache.put(key, summary)
+    return summary
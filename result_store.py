@@ -0,0 +1,226 @@
+"""Stores the full results of many simulation trials on disk in a columnar format that can be memory-mapped. Each
+column is a raw little-endian array in its own file, with dtypes, shapes, the event name table, the horizon and the
+step length in meta.json:
+
+    breached      bool     (trials,)
+    breach_year   int32    (trials,)     -1 if the site survived
+    breach_cause  int8     (trials,)     event code of the fatal event, -1 if the site survived
+    margins       float32  (trials, 5)   in MARGIN_KEYS order
+    offsets       int64    (trials+1,)   trial n's events are rows offsets[n] to offsets[n+1] of the event columns
+    event_year    int32    (events,)
+    event_code    int8     (events,)
+    event_stats   float32  (events, 5)   the stats at each event, in STAT_NAMES order
+
+simulate.simulate records one stats tuple per entry of its event list, so the stats share the event offsets"""
+
+import json
+import os
+from dataclasses import dataclass, field
+import numpy as np
+import simulate
+from event import events
+from batch import MARGIN_KEYS
+from marker_table import STAT_NAMES
+from streams import get_trial_rng
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+EVENT_NAMES = tuple(events)
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_NAMES)}
+NO_CAUSE = -1
+FLUSH_TRIALS = 65536 #trials buffered in memory before they are appended to the column files
+CHUNK_TRIALS = 1 << 22 #trials read at a time when aggregating
+
+#name -> (dtype, shape of one row); trial columns have a row per trial and event columns a row per event
+TRIAL_COLUMNS = {"breached": ("|b1", ()),
+                 "breach_year": ("<i4", ()),
+                 "breach_cause": ("|i1", ()),
+                 "margins": ("<f4", (len(MARGIN_KEYS),))}
+EVENT_COLUMNS = {"event_year": ("<i4", ()),
+                 "event_code": ("|i1", ()),
+                 "event_stats": ("<f4", (len(STAT_NAMES),))}
+
+def get_column_path(path, column):
+    """Returns the file holding a column of a result store"""
+    return os.path.join(path, column + ".bin")
+
+class ResultWriter:
+    """Appends trial results to a result store directory, creating it if needed. Use as a context manager, or call
+    close() to flush the last trials and write the metadata"""
+    def __init__(self, path, years=None, epoch_years=simulate.EPOCH_YEARS):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = read_meta(path) if os.path.exists(os.path.join(path, META_FILE)) else None
+        if meta is not None and meta["event_names"] != list(EVENT_NAMES):
+            raise ValueError(f"{path} was written with a different event table")
+        if meta is not None and meta.get("epoch_years", simulate.EPOCH_YEARS) != epoch_years:
+            raise ValueError(f"{path} was written with a different epoch length")
+        if meta is not None and years is not None and meta["years"] != years:
+            raise ValueError(f"{path} was written with a different horizon")
+        self.trials = meta["trials"] if meta else 0
+        self.events = meta["events"] if meta else 0
+        self.years = meta["years"] if meta else years
+        self.epoch_years = epoch_years
+        self.buffer = {column: [] for column in (*TRIAL_COLUMNS, *EVENT_COLUMNS, "offsets")}
+        if meta is None: #the first offset of an empty store
+            self.buffer["offsets"].append(0)
+
+    def add_trial(self, dead, event_list, map_list, margins_dict, stats_list): #pylint: disable=too-many-arguments,unused-argument
+        """Buffers the result of one call to simulate.simulate. The map history is not stored"""
+        buffer = self.buffer
+        buffer["breached"].append(dead)
+        buffer["breach_year"].append(event_list[-1][0] if dead else -1)
+        buffer["breach_cause"].append(EVENT_CODES[event_list[-1][1]] if dead else NO_CAUSE)
+        buffer["margins"].append([margins_dict[key] for key in MARGIN_KEYS])
+        for (year, name), stats in zip(event_list, stats_list):
+            buffer["event_year"].append(year)
+            buffer["event_code"].append(EVENT_CODES[name])
+            buffer["event_stats"].append(stats)
+        self.events += min(len(event_list), len(stats_list))
+        buffer["offsets"].append(self.events)
+        self.trials += 1
+        if len(buffer["breached"]) >= FLUSH_TRIALS:
+            self.flush()
+
+    def flush(self):
+        """Appends the buffered trials to the column files"""
+        columns = {**TRIAL_COLUMNS, **EVENT_COLUMNS, "offsets": ("<i8", ())}
+        for column, (dtype, shape) in columns.items():
+            values = np.array(self.buffer[column], dtype=dtype).reshape((-1, *shape))
+            with open(get_column_path(self.path, column), "ab") as file:
+                values.tofile(file)
+            self.buffer[column] = []
+        self.write_meta()
+
+    def write_meta(self):
+        """Writes the column layout and counts"""
+        meta = {"version": FORMAT_VERSION, "trials": self.trials, "events": self.events, "years": self.years,
+                "epoch_years": self.epoch_years, "event_names": list(EVENT_NAMES), "margin_keys": list(MARGIN_KEYS),
+                "stat_names": list(STAT_NAMES),
+                "trial_columns": {column: [dtype, list(shape)] for column, (dtype, shape) in TRIAL_COLUMNS.items()},
+                "event_columns": {column: [dtype, list(shape)] for column, (dtype, shape) in EVENT_COLUMNS.items()}}
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as file:
+            json.dump(meta, file, indent=2)
+
+    def close(self):
+        """Flushes the buffered trials and writes the metadata"""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_meta(path):
+    """Returns the metadata of a result store"""
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as file:
+        meta = json.load(file)
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"{path} has result store version {meta['version']}, expected {FORMAT_VERSION}")
+    return meta
+
+@dataclass
+class ResultSummary:
+    """Aggregates over every trial of a result store or batch"""
+    trials: int = 0
+    breaches: int = 0
+    breach_counts: dict = field(default_factory=dict) #fatal event name -> number of trials it ended
+    margin_sums: np.ndarray = field(default_factory=lambda: np.zeros(len(MARGIN_KEYS)))
+    margin_mins: np.ndarray = field(default_factory=lambda: np.ones(len(MARGIN_KEYS)))
+
+    @classmethod
+    def from_batch(cls, batch):
+        """Summarizes a batch.BatchResult"""
+        margins = np.array([batch.margins[key] for key in MARGIN_KEYS]).reshape(len(MARGIN_KEYS), -1)
+        return cls(trials=batch.trials, breaches=batch.breaches, breach_counts=dict(batch.breach_counts),
+                   margin_sums=margins.sum(axis=1), margin_mins=margins.min(axis=1, initial=1))
+
+    def to_json(self):
+        """Returns the summary as a JSON-ready dict"""
+        return {"trials": self.trials, "breaches": self.breaches, "breach_counts": self.breach_counts,
+                "margin_sums": self.margin_sums.tolist(), "margin_mins": self.margin_mins.tolist()}
+
+    @classmethod
+    def from_json(cls, obj):
+        """Rebuilds a summary from to_json's dict"""
+        return cls(trials=obj["trials"], breaches=obj["breaches"], breach_counts=obj["breach_counts"],
+                   margin_sums=np.array(obj["margin_sums"]), margin_mins=np.array(obj["margin_mins"]))
+
+    def survival_rate(self):
+        """Returns the fraction of trials in which the site was never breached"""
+        if self.trials == 0:
+            return 0
+        return (self.trials - self.breaches) / self.trials
+
+    def margin_means(self):
+        """Returns the mean margin of each hazard, keyed like simulate.simulate's margins dict"""
+        return dict(zip(MARGIN_KEYS, (self.margin_sums / max(self.trials, 1)).tolist()))
+
+class ResultStore:
+    """Read-only, memory-mapped view of a result store. Columns are NumPy memmaps, so slicing one only reads the
+    pages it touches"""
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_meta(path)
+        self.trials = self.meta["trials"]
+        self.event_names = tuple(self.meta["event_names"])
+        self.columns = {}
+        for column, (dtype, shape) in self.meta["trial_columns"].items():
+            self.columns[column] = self.open_column(column, dtype, (self.trials, *shape))
+        for column, (dtype, shape) in self.meta["event_columns"].items():
+            self.columns[column] = self.open_column(column, dtype, (self.meta["events"], *shape))
+        self.columns["offsets"] = self.open_column("offsets", "<i8", (self.trials+1,))
+
+    def open_column(self, column, dtype, shape):
+        """Memory-maps one column file"""
+        if shape[0] == 0: #np.memmap cannot map an empty file
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(get_column_path(self.path, column), dtype=dtype, mode="r", shape=shape)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __len__(self):
+        return self.trials
+
+    def get_events(self, trial):
+        """Returns a trial's event list as (year, event name) tuples"""
+        start, end = self.columns["offsets"][trial:trial+2]
+        return [(int(year), self.event_names[code]) for year, code in
+                zip(self.columns["event_year"][start:end], self.columns["event_code"][start:end])]
+
+    def get_stats(self, trial):
+        """Returns a trial's stats list as 5-tuples"""
+        start, end = self.columns["offsets"][trial:trial+2]
+        return [tuple(stats) for stats in self.columns["event_stats"][start:end].tolist()]
+
+    def iter_chunks(self, chunk_trials=CHUNK_TRIALS):
+        """Yields (start, end) trial ranges covering the store"""
+        for start in range(0, self.trials, chunk_trials):
+            yield start, min(start + chunk_trials, self.trials)
+
+    def summarize(self, chunk_trials=CHUNK_TRIALS):
+        """Aggregates breaches, causes and margins a chunk at a time, so the store never has to fit in memory"""
+        summary = ResultSummary()
+        cause_counts = np.zeros(len(self.event_names), dtype=np.int64)
+        for start, end in self.iter_chunks(chunk_trials):
+            breached = self.columns["breached"][start:end]
+            causes = self.columns["breach_cause"][start:end]
+            margins = self.columns["margins"][start:end]
+            summary.trials += end - start
+            summary.breaches += int(np.count_nonzero(breached))
+            cause_counts += np.bincount(causes[causes != NO_CAUSE], minlength=len(self.event_names))
+            summary.margin_sums += margins.sum(axis=0, dtype=np.float64)
+            summary.margin_mins = np.minimum(summary.margin_mins, margins.min(axis=0))
+        summary.breach_counts = {self.event_names[code]: int(count) for code, count in enumerate(cause_counts)
+                                 if count}
+        return summary
+
+def write_trials(path, layout, buffs, years, trials, seed, first_trial=0, epoch_years=simulate.EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Runs trials first_trial to first_trial+trials-1 of a root seed, as batch.run_trials does, and appends their full
+    results to a result store"""
+    with ResultWriter(path, years, epoch_years) as writer:
+        for trial in range(first_trial, first_trial+trials):
+            writer.add_trial(*simulate.simulate(years, layout, buffs, rng=get_trial_rng(seed, trial),
+                                                epoch_years=epoch_years))
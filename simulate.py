@@ -1,230 +1,242 @@
 """Contains simulation code to test whether a nuclear waste site with a given set of markers remains undisturbed"""
 
-import copy
-import random
 import math
+import random
+import time
+from collections import deque
+from functools import lru_cache
+import numpy as np
 from marker import markers
+from marker_table import MARKER_KEYS, MARKER_INDEX, MONOLITH_MASK, get_marker_stats, get_marker_stats_for_years, \
+    count_markers
+from site_grid import SiteMap, SparseSiteMap, MapHistory
+from sink import NULL_SINK
+from adjacency import get_adjacency_bonuses
+from event_flags import EventList, STAT_EVENT_MASK, get_event_flags, has_event
+from profiling import SimulationProfile
+from hazards import HAZARD_MODEL
 
 LOW_TECH = 0
 MEDIUM_TECH = 1
 HIGH_TECH = 2
 
-def simulate(years, site_map, global_buffs): #pylint: disable=too-many-locals,too-many-statements,too-many-return-statements
-    """Runs the simulation"""
+EPOCH_YEARS = 200 #the span the event and hazard odds are written for
+EPOCH_LENGTHS = (1, 10, 50, 200) #the step lengths the simulation is meant to be run at
+STEP_BLOCK = 256 #steps whose stats are computed together when stepping faster than EPOCH_YEARS
+
+#markers ruined by the vikings and earthquake/faultline events
+VIKINGS_REPLACEMENTS = {"attractive-monument": "ruined-attractive-monument",
+                        "visitor-center": "ruined-visitor-center",
+                        "atomic-flowers": "ruined-atomic-flowers"}
+EARTHQUAKE_REPLACEMENTS = {"granite-monolith": "ruined-granite-monolith",
+                           "metal-monolith": "ruined-metal-monolith",
+                           "wooden-monolith": "ruined-wooden-monolith"}
+
+def simulate(years, site_map, global_buffs, sink=NULL_SINK, rng=random, profile=False, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Runs the simulation, reporting progress to the given event sink and drawing every die from rng, which can be
+    the random module or any random.Random. The site is stepped epoch_years at a time, rolling the state of tech,
+    stats, events and hazards at every step; each event and hazard keeps the same yearly rate whatever the step.
+    With profile=True, a SimulationProfile of the wall time and calls of each phase is returned after the usual
+    5-tuple"""
+    if not profile:
+        return run_simulation(years, site_map, global_buffs, sink, rng, epoch_years=epoch_years)
+    timings = SimulationProfile(runs=1)
+    start = time.perf_counter()
+    result = run_simulation(years, site_map, global_buffs, sink, rng, timings, epoch_years)
+    timings.seconds = time.perf_counter() - start
+    return (*result, timings)
+
+def get_steps(years, epoch_years=EPOCH_YEARS):
+    """Returns the (end year, length) of each step of a run. A horizon that is not a whole number of steps ends with
+    a shorter step rather than being cut short"""
+    years = int(years)
+    return [(2000 + min(start + epoch_years, years), min(epoch_years, years - start))
+            for start in range(0, years, epoch_years)]
+
+def run_simulation(years, site_map, global_buffs, sink=NULL_SINK, rng=random, profile=None, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments,too-many-locals,too-many-statements,too-many-branches
+    """Runs the simulation, adding the time of each phase to profile unless it is None"""
 
     dead = False
-    event_list = [(0, "null")]
-    map_list = [site_map]
+    event_list = EventList([(0, "null")])
+    initial_map = SiteMap.coerce(site_map)
+    map_list = MapHistory(initial_map)
     stats_list = []
-    time_period_map = copy.deepcopy(site_map)
+    time_period_map = initial_map
     #set default stats
     usability, visibility, respectability, likability, \
         understandability = (10,0,0,0,0)
 
-    #initial values for "close to death-ness"
-    mining_margin = 1
-    archaeology_margin = 1
-    dam_margin = 1
-    teen_margin = 1
-    tunnel_margin = 1
-
-
-    for i in range(int(years/200)):
-
-        current_year = 2000+(200*(i+1))
-        print("Simulating to " + str(current_year))
-
-        sot = state_of_tech(current_year)
-        print("state of tech is " + str(sot))
-
-        usability, visibility, respectability, likability, \
-        understandability = get_stats(time_period_map, global_buffs, current_year, sot, event_list)
+    #initial values for "close to death-ness", keyed by hazard name
+    margins_dict = dict.fromkeys(HAZARD_MODEL.names, 1)
+
+
+    steps = get_steps(years, epoch_years)
+    #short steps read their stats from blocks of STEP_BLOCK steps computed in one pass, for every state of tech.
+    #Like get_stats, reported and profiled runs skip the memo so every step pays, and reports, its full cost
+    batched = epoch_years < EPOCH_YEARS and not sink.enabled and profile is None
+    if batched:
+        buffs = tuple(global_buffs)
+        year_blocks = [tuple(year for year, _ in steps[first:first+STEP_BLOCK])
+                       for first in range(0, len(steps), STEP_BLOCK)]
+
+    for step, (current_year, step_years) in enumerate(steps):
+
+        if sink.enabled:
+            sink.emit("epoch_start", year=current_year)
+
+        if profile is not None:
+            profile.start_epoch(current_year)
+            start = time.perf_counter()
+        sot = state_of_tech(current_year, rng)
+        if profile is not None:
+            profile.record("state_of_tech", start)
+        if sink.enabled:
+            sink.emit("state_of_tech", sot=sot)
+
+        if profile is not None:
+            start = time.perf_counter()
+        if batched:
+            block, offset = divmod(step, STEP_BLOCK)
+            usability, visibility, respectability, likability, understandability = \
+                get_stats_block(time_period_map, buffs, year_blocks[block],
+                                event_list.flags & STAT_EVENT_MASK)[offset, sot].tolist()
+        else:
+            usability, visibility, respectability, likability, \
+            understandability = get_stats(time_period_map, global_buffs, current_year, sot, event_list, sink, profile)
+        if profile is not None:
+            profile.record("get_stats", start)
         if len(event_list) > len(stats_list):
             stats_list.append((usability, visibility, respectability, likability, understandability))
 
-        event, event_year = get_random_event(current_year, sot, site_map,usability,
+        if profile is not None:
+            start = time.perf_counter()
+        event, event_year = get_random_event(current_year, sot, initial_map,usability,
                                              visibility, respectability, likability, understandability,
-                                             global_buffs)
+                                             global_buffs, sink, rng, step_years)
+        if profile is not None:
+            profile.record("get_random_event", start)
         if event != "":
-            print ("In the year " + str(event_year) + ", " + str(event) +
-                    " happened!")
+            if sink.enabled:
+                sink.emit("event", year=event_year, event=event)
             event_list.append((event_year, event))
             stats_list.append((usability, visibility, respectability, likability, understandability))
             vikings = (event =="vikings")
             earthquake = (event == "earthquake")
             faultline = (event == "faultline")
             if vikings or earthquake or faultline:
+                if profile is not None:
+                    start = time.perf_counter()
                 time_period_map = get_modified_map(time_period_map, vikings, earthquake, faultline)
+                if profile is not None:
+                    profile.record("get_modified_map", start)
             map_list.append(time_period_map)
 
         #handle instakill events
-        if any("aliens" in tup for tup in event_list) or any("cult-dig" in tup for tup in event_list):
+        if event_list.has("aliens") or event_list.has("cult-dig"):
             dead = True
-            margins_dict = {"mining": mining_margin,
-                            "archaeology": archaeology_margin,
-                            "dams":  dam_margin,
-                            "teens": teen_margin,
-                            "tunnels": tunnel_margin}
             map_list.append(time_period_map)
             return dead, event_list, map_list, margins_dict, stats_list
 
         #handle events that change the map
 
 
-        print("usability, visibility, respectability, likability, understandability:")
-        print(usability, visibility,respectability,  likability,
-              understandability)
+        if sink.enabled:
+            sink.emit("stats", usability=usability, visibility=visibility, respectability=respectability,
+                      likability=likability, understandability=understandability)
 
+        if profile is not None:
+            start = time.perf_counter()
         kop = get_knowledge_of_past(visibility, respectability, likability,
                       understandability)
-        print("knowledge of past is " + str(kop))
-
-        vom = get_value_of_materials(current_year)
-        print ("value of materials is " + str(vom))
-
-        miners = miner_prob(kop, vom, understandability, 200)
-        print("200 year probability of mining is " + str(miners))
-        mine_die = random.random()
-        if mine_die < miners:
-            mine_year = random.randint(event_year+1,current_year)
-            print("I rolled " + str(mine_die) +
-                  ", so mining did happen in year " +
-                  str(mine_year))
-            event_list.append((mine_year, "miners"))
-            stats_list.append((usability, visibility, respectability, likability, understandability))
-            dead = True
-            mining_margin = 0
-            margins_dict = {"mining": mining_margin,
-                            "archaeology": archaeology_margin,
-                            "dams":  dam_margin,
-                            "teens": teen_margin,
-                            "tunnels": tunnel_margin}
-            map_list.append(time_period_map)
-            return dead, event_list, map_list, margins_dict, stats_list
-        print("I rolled " + str(mine_die) +
-              ", so no mining happened by year " + str(current_year))
-        mining_margin = min(mining_margin, mine_die-miners)
-
-        archaeologists = arch_prob(kop, current_year-200, understandability)
-        print("200 year probability of archaeologists is " +
-              str(archaeologists))
-        arch_die = random.random()
-        if arch_die < archaeologists:
-            arch_year = random.randint(event_year+1,current_year)
-            print("I rolled " + str(arch_die) +
-                  ", so archaeology did happen in year " +
-                  str(arch_year))
-            event_list.append((arch_year, "archaeologists"))
-            stats_list.append((usability, visibility, respectability, likability, understandability))
-            dead = True
-            archaeology_margin = 0
-            margins_dict = {"mining": mining_margin,
-                            "archaeology": archaeology_margin,
-                            "dams":  dam_margin,
-                            "teens": teen_margin,
-                            "tunnels": tunnel_margin}
-            map_list.append(time_period_map)
-            return dead, event_list, map_list, margins_dict, stats_list
-        print("I rolled " + str(arch_die) +
-              ", so no archaeology happened by year " + str(current_year))
-        archaeology_margin = min(archaeology_margin, arch_die-archaeologists)
-
-        dams = dam_prob(kop, usability, current_year-200, understandability)
-        print("200 year probability of dam builders is " +
-              str(dams))
-        dam_die = random.random()
-        if dam_die < dams:
-            dam_year = random.randint(event_year+1,current_year)
-            print("I rolled " + str(dam_die) +
-                  ", so dam bulidng did happen in year " +
-                  str(dam_year))
-            dead = True
-            event_list.append((dam_year, "dams"))
-            stats_list.append((usability, visibility, respectability, likability, understandability))
-            dam_margin = 0
-            margins_dict = {"mining": mining_margin,
-                            "archaeology": archaeology_margin,
-                            "dams":  dam_margin,
-                            "teens": teen_margin,
-                            "tunnels": tunnel_margin}
-            map_list.append(time_period_map)
-            return dead, event_list, map_list, margins_dict, stats_list
-        print("I rolled " + str(dam_die) +
-              ", so no dam building happened by year " + str(current_year))
-        dam_margin = min(dam_margin, dam_die-dams)
-
-        teens = teen_prob(visibility, respectability, understandability)
-        print("200 year probability of teens is " +
-              str(teens))
-        teen_die = random.random()
-        if teen_die < teens:
-            teen_year = random.randint(event_year+1,current_year)
-            print("I rolled " + str(teen_die) +
-                  ", so teens did happen in year " +
-                  str(teen_year))
-            dead = True
-            teen_margin = 0
-            event_list.append((teen_year, "teens"))
-            stats_list.append((usability, visibility, respectability, likability, understandability))
-            margins_dict = {"mining": mining_margin,
-                            "archaeology": archaeology_margin,
-                            "dams":  dam_margin,
-                            "teens": teen_margin,
-                            "tunnels": tunnel_margin}
-            map_list.append(time_period_map)
-            return dead, event_list, map_list, margins_dict, stats_list
-        print("I rolled " + str(teen_die) +
-              ", so no teens happened by year " + str(current_year))
-        teen_margin = min(teen_margin, teen_die-teens)
-
-        transit_tunnel = transit_tunnel_prob(sot, understandability, visibility)
-        print("200 year probability of transit tunnel is " + str(transit_tunnel))
-        transit_tunnel_die = random.random()
-        if transit_tunnel_die < transit_tunnel:
-            transit_tunnel_year = random.randint(event_year+1,current_year)
-            print("I rolled " + str(transit_tunnel_die) + ", so a transit tunnel breached the site in year " +str(
-                transit_tunnel_year))
-            dead = True
-            event_list.append((transit_tunnel_year, "tunnel"))
-            stats_list.append((usability, visibility, respectability, likability, understandability))
-            tunnel_margin = 0
-            margins_dict = {"mining": mining_margin,
-                            "archaeology": archaeology_margin,
-                            "dams":  dam_margin,
-                            "teens": teen_margin,
-                            "tunnels": tunnel_margin}
-            map_list.append(time_period_map)
-            return dead, event_list, map_list, margins_dict, stats_list
-        print("I rolled " + str(transit_tunnel_die) + ", so no transit tunnel disrupted the site by year " + str(
-            current_year))
-        tunnel_margin = min(tunnel_margin, transit_tunnel_die - transit_tunnel)
-
-    margins_dict = {"mining": mining_margin,
-                            "archaeology": archaeology_margin,
-                            "dams":  dam_margin,
-                            "teens": teen_margin,
-                            "tunnels": tunnel_margin}
+        if sink.enabled:
+            sink.emit("knowledge_of_past", kop=kop)
+
+        vom = get_value_of_materials(current_year, rng)
+        if sink.enabled:
+            sink.emit("value_of_materials", vom=vom)
+
+        #every hazard's odds come from one lookup; the dice are then rolled in order until one breaches the site
+        value_die = rng.random()
+        probs = HAZARD_MODEL.get_probabilities((kop, current_year-step_years, usability, visibility, respectability,
+                                                sot, vom, value_die), understandability, step_years)
+        for hazard, prob in zip(HAZARD_MODEL.hazards, probs):
+            if sink.enabled:
+                sink.emit("hazard_probability", hazard=hazard.name, prob=prob, years=step_years)
+            die = rng.random()
+            if die < prob:
+                breach_year = rng.randint(min(event_year+1, current_year),current_year)
+                if sink.enabled:
+                    sink.emit("hazard_breached", hazard=hazard.name, die=die, prob=prob, year=breach_year)
+                event_list.append((breach_year, hazard.event))
+                stats_list.append((usability, visibility, respectability, likability, understandability))
+                dead = True
+                margins_dict[hazard.name] = 0
+                if profile is not None:
+                    profile.record("hazards", start)
+                map_list.append(time_period_map)
+                return dead, event_list, map_list, margins_dict, stats_list
+            if sink.enabled:
+                sink.emit("hazard_survived", hazard=hazard.name, die=die, prob=prob, year=current_year)
+            margins_dict[hazard.name] = min(margins_dict[hazard.name], die-prob)
+        if profile is not None:
+            profile.record("hazards", start)
 
     return dead, event_list, map_list, margins_dict, stats_list
 
+def get_event_ladder(current_year, sot, num_monoliths, respectability, global_buffs):
+    """Returns the (event name, condition, die threshold) rungs get_random_event checks, in order. The first rung
+    whose condition holds and whose threshold is above the die roll is the event. Works on scalars or on arrays of
+    trials"""
+    bad_cult = "bad-cult" in global_buffs
+    cat_holics = bad_cult and "ray-cats" in global_buffs
+    return [
+        ("aliens", (current_year > 5000) & (sot == 2), .000005),
+        ("goths", current_year > 2400, .01),
+        ("vikings", (current_year > 2600) & (sot == 0), .01),
+        ("earthquake", True, .009),
+        ("cult-dig", bad_cult & (current_year > 3000), .5),
+        ("faultline", True, .013),
+        ("cat-holics", cat_holics & (current_year > 3000), .6),
+        ("stonehenge", num_monoliths > 5, .04),
+        ("flood", True, .019),
+        ("klingon", (sot == 1) & (current_year < 3000), .047),
+        ("turtle", sot == 2, .03),
+        ("smog", sot == 1, .18),
+        ("park", (sot > 0) & (current_year > 2500) & (respectability > 3), .4),
+    ]
+
+def get_ladder_die(ladder, die, fraction):
+    """Maps a die rolled for a step of fraction*EPOCH_YEARS onto an event ladder written for EPOCH_YEARS. A rung
+    with odds p per EPOCH_YEARS gets odds 1-(1-p)**fraction in the step, compounding like the hazards do, and rolls
+    that land on no rung map to 1"""
+    covered = low = 0 #the ladder die below covered and the step die below low belong to earlier rungs
+    for _, condition, threshold in ladder:
+        if condition and threshold > covered:
+            odds = threshold - covered
+            step_odds = 1-(1-odds)**fraction
+            if die < low + step_odds:
+                return min(covered + (die - low)*odds/step_odds, math.nextafter(threshold, 0))
+            low += step_odds
+            covered = threshold
+    return 1
+
 def get_random_event(current_year, sot, site_map,usability, visibility, respectability, likability, #pylint: disable=too-many-arguments,too-many-branches
-        understandability, global_buffs):
-    """Potentially generates an event given a year"""
+        understandability, global_buffs, sink=NULL_SINK, rng=random, epoch_years=EPOCH_YEARS):
+    """Potentially generates an event in the epoch_years up to the given year. The odds below are per EPOCH_YEARS,
+    so for other steps the die is mapped onto the ladder by get_ladder_die"""
 
     event = ""
     #generate a year for the thing to have happened i
-    event_year = current_year - random.randint(0,199)
-
-    die = random.random()
-    print("bad cult? " + str(("bad-cult" in global_buffs)))
-    print("current year: " + str(current_year))
-    print(die)
-    print('met dig conditions: ' + str(("bad-cult" in global_buffs) and current_year > 3000 and die <.5))
-    num_monoliths =0
-    for row in site_map:
-        for tile in row:
-            if "monolith" in markers[tile].tags:
-                num_monoliths += 1
+    event_year = current_year - rng.randint(0,epoch_years-1)
+
+    die = rng.random()
+    num_monoliths = int(MONOLITH_MASK @ SiteMap.coerce(site_map).marker_counts())
+    if epoch_years != EPOCH_YEARS:
+        ladder = get_event_ladder(current_year, sot, num_monoliths, respectability, global_buffs)
+        die = get_ladder_die(ladder, die, epoch_years/EPOCH_YEARS)
+    if sink.enabled:
+        sink.emit("event_roll", bad_cult=("bad-cult" in global_buffs), year=current_year, die=die,
+                  dig_conditions=(("bad-cult" in global_buffs) and current_year > 3000 and die <.5))
 
     if current_year > 5000 and sot == 2 and die < .000005:
             event = "aliens"
@@ -239,7 +251,8 @@ def get_random_event(current_year, sot, site_map,usability, visibility, respecta
         event = "earthquake"
 
     elif ("bad-cult" in global_buffs) and current_year > 3000 and die <.5:
-        print("cult dig!!!")
+        if sink.enabled:
+            sink.emit("cult_dig")
         event = "cult-dig"
 
     elif die < .013:
@@ -288,13 +301,13 @@ def get_knowledge_of_past(visibility, respectability, likability,
 
 
 
-def get_value_of_materials(current_year):
+def get_value_of_materials(current_year, rng=random):
     '''returns 1 if materials have high value, 0 if low'''
     #probabilities taken roughly from WIPP report
     if current_year < 2300:
-        vom = random.randint(0,1)
+        vom = rng.randint(0,1)
     else:
-        die = random.random()
+        die = rng.random()
         if die < .33:
             vom = 1
         else:
@@ -302,10 +315,10 @@ def get_value_of_materials(current_year):
     return vom
 
 
-def state_of_tech(current_year):
+def state_of_tech(current_year, rng=random):
     '''returns 0 for low tech, 1 for med, 2 for high'''
     #probabilities taken exactly from WIPP report
-    die = random.random()
+    die = rng.random()
     if current_year <= 2300:
         if die <= .8:
             tech = 2
@@ -330,8 +343,74 @@ def state_of_tech(current_year):
     return tech
 
 
-def get_stats(site_map, global_buffs, current_year,sot, event_list): #pylint: disable=too-many-branches,too-many-locals
-    """gives the 5 stats given your equipment, year, and state of tech"""
+def get_stats(site_map, global_buffs, current_year,sot, event_list, sink=NULL_SINK, profile=None): #pylint: disable=too-many-arguments
+    """gives the 5 stats given your equipment, year, and state of tech. Profiled calls skip the memo, so every one
+    pays the full cost of its phases"""
+    site_map = SiteMap.coerce(site_map)
+    flags = get_event_flags(event_list) & STAT_EVENT_MASK
+    if sink.enabled or profile is not None:
+        return compute_stats(site_map, tuple(global_buffs), current_year, sot, flags, sink, profile)
+    return get_stats_for_flags(site_map, tuple(global_buffs), current_year, sot, flags)
+
+@lru_cache(maxsize=8192)
+def get_stats_for_flags(site_map, global_buffs, current_year, sot, flags):
+    """Returns the stats of a SiteMap and tuple of buffs given the word of event flags that have happened. Computed
+    once per distinct key"""
+    return compute_stats(site_map, global_buffs, current_year, sot, flags)
+
+def get_stat_events(flags):
+    """Returns whether each event that changes the stats has happened, as (cat-holics, stonehenge, flood, smog,
+    klingon, turtle, goths, faultline, park)"""
+    return (has_event(flags, "cat-holics"), has_event(flags, "stonehenge"), has_event(flags, "flood"),
+            has_event(flags, "somg"), has_event(flags, "cat-holics"), has_event(flags, "cat-holics"),
+            has_event(flags, "goths"), has_event(flags, "faultline"), has_event(flags, "park"))
+
+@lru_cache(maxsize=1024)
+def get_stats_block(site_map, global_buffs, years, flags):
+    """Returns a read-only (years, 3, 5) array of the stats of a SiteMap and tuple of buffs at each of a tuple of
+    years and each state of tech, given a word of event flags. Computed once per distinct key"""
+    stats = compute_stats_block(site_map, global_buffs, years, flags)
+    stats.flags.writeable = False
+    return stats
+
+def compute_stats_block(site_map, global_buffs, years, flags): #pylint: disable=too-many-locals
+    """compute_stats for a sequence of years and every state of tech at once. Returns a (years, 3, 5) array"""
+    catholics, stonehenge, flood, smog, klingon, turtle, goths, faultline, park = get_stat_events(flags)
+    counts = site_map.marker_counts() + count_markers(global_buffs)
+    terraforming_weights = get_terraforming_weights(site_map)
+    bonuses = get_adjacency_bonuses(site_map, goths)
+    stats = np.empty((len(years), 3, 5))
+    for sot in (LOW_TECH, MEDIUM_TECH, HIGH_TECH):
+        marker_stats = get_marker_stats_for_years(years, sot, klingon, turtle, goths, faultline)
+        usability, visibility, respectability, likability, understandability = (counts @ marker_stats).T
+        usability = usability + 100
+
+        #some stats are dependent on visibility
+        visibility_scale = np.where(visibility < .1, .1, np.where(visibility < 1, .8, 1))
+        respectability = respectability * visibility_scale
+        likability = likability * visibility_scale
+        understandability = understandability * visibility_scale
+
+        terraforming = (terraforming_weights @ marker_stats).T
+        visibility = visibility + bonuses.visibility + terraforming[1]
+        understandability = understandability + bonuses.synergy_understandability + \
+            bonuses.pro_educational_understandability + terraforming[4]
+        respectability = respectability + bonuses.spooky_respectability + terraforming[2] + \
+            bonuses.monolith_respectability
+        likability = likability + bonuses.spooky_likability + terraforming[3]
+        usability = usability + terraforming[0] + bonuses.monolith_usability
+
+        likability = likability + 10*catholics + 7*stonehenge + 15*park
+        usability = usability + 20*flood - 20*park
+        if smog:
+            visibility = np.minimum(visibility, 20)
+        visibility = np.maximum(0, visibility)
+        stats[:, sot] = np.clip([usability, visibility, respectability, likability, understandability],
+                                -100, 100).T / 100
+    return stats
+
+def compute_stats(site_map, global_buffs, current_year, sot, flags, sink=NULL_SINK, profile=None): #pylint: disable=too-many-arguments,too-many-branches,too-many-locals
+    """Computes the 5 stats of a SiteMap given a word of event flags"""
 
     usability = 100
     visibility = 0
@@ -340,34 +419,16 @@ def get_stats(site_map, global_buffs, current_year,sot, event_list): #pylint: di
     understandability = 0
 
     #stat changes for events
-    catholics = any("cat-holics" in tup for tup in event_list)
-    stonehenge = any("stonehenge" in tup for tup in event_list)
-    flood = any("flood" in tup for tup in event_list)
-    smog = any("somg" in tup for tup in event_list)
-    klingon = any("cat-holics" in tup for tup in event_list)
-    turtle = any("cat-holics" in tup for tup in event_list)
-    goths = any("goths" in tup for tup in event_list)
-    faultline = any("faultline" in tup for tup in event_list)
-    park = any("park" in tup for tup in event_list)
-
-    for buff in global_buffs:
-        values_list = get_stats_for_marker(buff, current_year, sot,klingon, turtle,goths, faultline)
-
-        usability += values_list[0]
-        visibility += values_list[1]
-        respectability += values_list[2]
-        likability += values_list[3]
-        understandability += values_list[4]
-
-    for row in site_map:
-        for entry in row:
-            values_list = get_stats_for_marker(entry, current_year, sot,klingon, turtle,goths, faultline)
-
-            usability += values_list[0]
-            visibility += values_list[1]
-            respectability += values_list[2]
-            likability += values_list[3]
-            understandability += values_list[4]
+    catholics, stonehenge, flood, smog, klingon, turtle, goths, faultline, park = get_stat_events(flags)
+
+    #sum the stats of every buff and tile at once
+    marker_stats = get_marker_stats(current_year, sot, klingon, turtle, goths, faultline)
+    totals = (site_map.marker_counts() + count_markers(global_buffs)) @ marker_stats
+    usability += float(totals[0])
+    visibility += float(totals[1])
+    respectability += float(totals[2])
+    likability += float(totals[3])
+    understandability += float(totals[4])
 
     #some stats are dependent on visibility
     if visibility < .1:
@@ -380,6 +441,8 @@ def get_stats(site_map, global_buffs, current_year,sot, event_list): #pylint: di
         understandability *= .8
 
 
+    if profile is not None:
+        start = time.perf_counter()
     usability, visibility, respectability, likability, understandability = get_adjacency_bonus(site_map,
                                                                                                usability,
                                                                                                visibility,
@@ -391,7 +454,10 @@ def get_stats(site_map, global_buffs, current_year,sot, event_list): #pylint: di
                                                                                                klingon,
                                                                                                turtle,
                                                                                                goths,
-                                                                                               faultline)
+                                                                                               faultline,
+                                                                                               sink)
+    if profile is not None:
+        profile.record("adjacency", start)
 
     if catholics:
         likability += 10
@@ -407,7 +473,9 @@ def get_stats(site_map, global_buffs, current_year,sot, event_list): #pylint: di
 
     visibility = max(0, visibility)
     
-    print("Pre-normalization understandability: ", understandability, " visibility: ", visibility, " respectability: ", respectability, " likability: ", likability, " usability: ", usability)
+    if sink.enabled:
+        sink.emit("pre_normalization_stats", usability=usability, visibility=visibility,
+                  respectability=respectability, likability=likability, understandability=understandability)
     return normalize_stat(usability), normalize_stat(visibility), normalize_stat(respectability),\
         normalize_stat(likability), normalize_stat(understandability)
 
@@ -417,126 +485,37 @@ def normalize_stat(stat_value):
     stat_value = max(stat_value, -100)
     return stat_value / 100
 
-def get_stats_for_marker(marker_id, current_year, sot, klingon, turtle, goths, faultline): #pylint: disable=too-many-arguments,too-many-branches
+def get_stats_for_marker(marker_id, current_year, sot, klingon, turtle, goths, faultline): #pylint: disable=too-many-arguments
     """Gets the stats for a particular marker, adjusted for decay and state of technology"""
-    inits_list = [list(markers[marker_id].usability_init),
-                  list(markers[marker_id].visibility_init),
-                  list(markers[marker_id].respectability_init),
-                  list(markers[marker_id].likability_init),
-                  list(markers[marker_id].understandability_init)]
-
-    #very special case for goth event - flip likability for spoopy stuff
-    if goths:
-        if "spooky" in markers[marker_id].tags:
-            inits_list[3][0] = -1* inits_list[3][0]
-            inits_list[3][1] = -1* inits_list[3][1]
-            inits_list[3][2] = -1* inits_list[3][2]
-    #special case for klingon event: understandability down
-    if klingon:
-        if "linguistic" in markers[marker_id].tags:
-            inits_list[4][0] = .5* inits_list[4][0]
-            inits_list[4][1] = .5* inits_list[4][1]
-            inits_list[4][2] = .5* inits_list[4][2]
-    #special case for turtles! understandability down for more stuff
-    if turtle:
-        if "linguistic" in markers[marker_id].tags or "pictoral" in markers[marker_id].tags:
-            inits_list[4][0] = .7* inits_list[4][0]
-            inits_list[4][1] = .7* inits_list[4][1]
-            inits_list[4][2] = .7* inits_list[4][2]
-    #faultline: vis up for buried markers
-    if faultline:
-        if "buried" in markers[marker_id].tags:
-            inits_list[1][0] = 2* inits_list[1][0]
-            inits_list[1][1] = 2* inits_list[1][1]
-            inits_list[1][2] = 2* inits_list[1][2]
-
-
-
-    decays_list =[markers[marker_id].usability_decay, markers[marker_id].visibility_decay,
-                  markers[marker_id].respectability_decay, markers[marker_id].likability_decay,
-                  markers[marker_id].understandability_decay]
-    values_list = []
-
-    for j in range(len(inits_list)): #pylint: disable=consider-using-enumerate
-        init_val = inits_list[j][sot]
-
-        if decays_list[j] == "constant":
-            values_list.append(init_val)
-        elif decays_list[j] == "slow_lin_0":
-            values_list.append(-.0008*(current_year-2000) + init_val)
-        elif decays_list[j] == "lin_0":
-            values_list.append(-.002*(current_year-2000) + init_val)
-        elif decays_list[j] == "fast_lin_0":
-            values_list.append(-.005*(current_year-2000) + init_val)
-        elif decays_list[j] == "slow_lin_inc_8":
-            values_list.append(.0002*(current_year-2000) + init_val)
-        elif decays_list[j] == "slow_lin_inc_3":
-            values_list.append(.0003*(current_year-2000) + init_val)
-        elif decays_list[j] == "exp_0":
-            values_list.append(init_val*math.exp(-.001*(current_year-2000)))
-        elif decays_list[j] == "exp_neg_10":
-            values_list.append((init_val+10)*math.exp(-.001*(current_year-2000))-10)
-        elif decays_list[j] == "tech_curve":
-            if sot == 0:
-                values_list.append((init_val+5)*math.exp(-.005*(current_year-2000))-5)
-            else:
-                values_list.append(.0005*(current_year-2000) + init_val)
-
-    return values_list
+    return get_marker_stats(current_year, sot, klingon, turtle, goths, faultline)[MARKER_INDEX[marker_id]].tolist()
 
 def get_adjacency_bonus(site_map,usability, visibility, respectability, likability, #pylint: disable=too-many-arguments, too-many-locals
-        understandability, current_year, sot, klingon, turtle, goths, faultline):
+        understandability, current_year, sot, klingon, turtle, goths, faultline, sink=NULL_SINK):
     """checks if anything on the map gets adjacency bonus and modifies stats directly"""
-    #right now, just checking for a vis bonus tag and giving bonus to vis
-    visibility += get_visibility_adjacency_bonus(site_map)
+    bonuses = get_adjacency_bonuses(site_map, goths)
+    visibility += bonuses.visibility
 
-    understandability += get_synergy_partnership_bonus(site_map)
+    understandability += bonuses.synergy_understandability
 
-    spooky_respectability_modifier, spooky_likability_modifier = get_spooky_adjacency_bonus(site_map, goths)
-    respectability += spooky_respectability_modifier
-    likability += spooky_likability_modifier
+    respectability += bonuses.spooky_respectability
+    likability += bonuses.spooky_likability
 
-    understandability += get_pro_educational_adjacency_bonus(site_map)
+    understandability += bonuses.pro_educational_understandability
 
     terraforming_usability_modifier, terraforming_visibility_modifier, terraforming_respectability_modifier,\
             terraforming_likability_modifier, terraforming_understandability_modifier = \
-            get_massive_terraforming_bonus(site_map, current_year, sot,klingon, turtle,goths, faultline)
+            get_massive_terraforming_bonus(site_map, current_year, sot,klingon, turtle,goths, faultline, sink)
     usability += terraforming_usability_modifier
     visibility += terraforming_visibility_modifier
     respectability += terraforming_respectability_modifier
     likability += terraforming_likability_modifier
     understandability += terraforming_understandability_modifier
 
-    monolith_usability_penalty, monolith_respectability_bonus = get_standing_stones_bonus(site_map)
-    usability += monolith_usability_penalty
-    respectability += monolith_respectability_bonus
+    usability += bonuses.monolith_usability
+    respectability += bonuses.monolith_respectability
 
     return usability, visibility, respectability, likability, understandability
 
-def get_neighbors(site_map, row_num, col_num):
-    """Given a site map and a pair of coordinates, returns the neighbors of those coordinates"""
-    neighbors = []
-    if row_num-1 >= 0:
-        neighbors.append(site_map[row_num-1][col_num])
-        if col_num-1 >=0:
-            neighbors.append(site_map[row_num-1][col_num-1])
-        if col_num+1 < len(site_map[row_num]):
-            neighbors.append(site_map[row_num-1][col_num+1])
-
-    if row_num+1 < len(site_map):
-        neighbors.append(site_map[row_num+1][col_num])
-        if col_num-1 >=0:
-            neighbors.append(site_map[row_num+1][col_num-1])
-        if col_num+1 < len(site_map[row_num]):
-            neighbors.append(site_map[row_num+1][col_num+1])
-
-    if col_num-1 >= 0:
-        neighbors.append(site_map[row_num][col_num-1])
-    if col_num+1 < len(site_map[row_num]):
-        neighbors.append(site_map[row_num][col_num+1])
-
-    return neighbors
-
 def get_neighbor_coords(site_map, row_num, col_num):
     """Given a site map and a pair of coordinates, returns the neighboring coordinates of those coordinates"""
     neighbors = []
@@ -561,305 +540,130 @@ def get_neighbor_coords(site_map, row_num, col_num):
 
     return neighbors
 
-def get_like_contiguous_markers(site_map, row_num, col_num):
+def get_like_contiguous_markers(site_map, row_num, col_num, sink=NULL_SINK):
     """Returns the number of markers in the block of contiguous markers of which (row_num, col_num) is a part,
     which all share a type with the marker at (row_num, col_num)"""
-    num_contiguous_markers = 0
-    coords_visited = []
-    coords_to_visit = [(row_num, col_num)]
-    marker_type = site_map[row_num][col_num]
-    while coords_to_visit:
-        current_coords = coords_to_visit.pop()
-        coords_visited.append(current_coords)
-        this_marker = site_map[current_coords[0]][current_coords[1]]
-        if this_marker == marker_type:
-            num_contiguous_markers += 1
-            neighbor_coords = get_neighbor_coords(site_map, current_coords[0], current_coords[1])
-            like_neighbor_coords = [coords for coords in neighbor_coords if site_map[coords[0]][coords[1]] == this_marker]
-            unvisited_like_neighbor_coords = [coords for coords in like_neighbor_coords if coords not in coords_visited]
-            unvisited_unscheduled_like_neighbor_coords = [coords for coords in unvisited_like_neighbor_coords if coords not in coords_to_visit]
-            coords_to_visit[:0] = unvisited_unscheduled_like_neighbor_coords
-
-    print(num_contiguous_markers)
+    labels, sizes, _ = get_like_components(site_map)
+    num_contiguous_markers = sizes[labels[row_num][col_num]]
+    if sink.enabled:
+        sink.emit("contiguous_markers", count=num_contiguous_markers)
     return num_contiguous_markers
 
+def get_like_components(site_map):
+    """Labels every block of contiguous like markers on the map. Returns a grid of block labels (for a
+    SparseSiteMap, the label of each occupied tile in key order), the size of each block and the marker each block
+    is made of. Computed once per distinct map"""
+    return label_like_components(SiteMap.coerce(site_map))
+
+@lru_cache(maxsize=256)
+def label_like_components(site_map):
+    """Labels the blocks of contiguous like markers of a SiteMap, visiting each tile once"""
+    if isinstance(site_map, SparseSiteMap):
+        return label_sparse_components(site_map)
+    codes = site_map.codes.tolist()
+    labels = [[None]*len(row) for row in codes]
+    sizes = []
+    block_markers = []
+    for row_num in range(len(codes)): #pylint: disable=consider-using-enumerate
+        for col_num in range(len(codes[row_num])):
+            if labels[row_num][col_num] is not None:
+                continue
+            label = len(sizes)
+            marker_type = codes[row_num][col_num]
+            labels[row_num][col_num] = label
+            coords_to_visit = deque([(row_num, col_num)])
+            block_size = 0
+            while coords_to_visit:
+                current_coords = coords_to_visit.popleft()
+                block_size += 1
+                for coords in get_neighbor_coords(codes, current_coords[0], current_coords[1]):
+                    if labels[coords[0]][coords[1]] is None and codes[coords[0]][coords[1]] == marker_type:
+                        labels[coords[0]][coords[1]] = label
+                        coords_to_visit.append(coords)
+            sizes.append(block_size)
+            block_markers.append(MARKER_KEYS[marker_type])
+    return tuple(tuple(row) for row in labels), tuple(sizes), tuple(block_markers)
+
+def label_sparse_components(site_map):
+    """Labels the blocks of contiguous like markers among the occupied tiles of a SparseSiteMap. Each tile starts
+    as its own block and takes the smallest label among its like neighbors, with labels followed to their roots,
+    until no label changes"""
+    codes = site_map.codes
+    neighbors = site_map.get_neighbors()
+    tiles = np.broadcast_to(np.arange(len(codes)), neighbors.shape)
+    alike = (neighbors >= 0) & (codes[np.maximum(neighbors, 0)] == codes)
+    tiles, neighbors = tiles[alike], neighbors[alike]
+    labels = np.arange(len(codes))
+    while True:
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, tiles, labels[neighbors])
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    roots, labels = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(labels, minlength=len(roots))
+    return tuple(labels.tolist()), tuple(sizes.tolist()), tuple(MARKER_KEYS[code] for code in codes[roots].tolist())
+
 def get_standing_stones_bonus(site_map):
     """Calculates the usability and respectability modifiers for adjacent monoliths"""
-    usability_penalty = 0
-    respectability_bonus = 0
-    for row_num in range(len(site_map)): #pylint: disable=consider-using-enumerate, too-many-nested-blocks
-        for col_num in range(len(site_map[row_num])):
-            this_marker = site_map[row_num][col_num]
-            if markers[this_marker].is_monolith():
-                neighbors = get_neighbors(site_map, row_num, col_num)
-                for neighbor in neighbors:
-                    if markers[neighbor].is_monolith():
-                        usability_penalty -= .5
-                        respectability_bonus += .5
-
-    return usability_penalty, respectability_bonus
-
-
-def get_massive_terraforming_bonus(site_map, current_year, sot,klingon, turtle,goths, faultline):
+    bonuses = get_adjacency_bonuses(site_map, False)
+    return bonuses.monolith_usability, bonuses.monolith_respectability
+
+@lru_cache(maxsize=256)
+def get_terraforming_weights(site_map):
+    """Returns, per marker code, how many times its stats are added by the massive terraforming bonus of a SiteMap"""
+    _, sizes, block_markers = label_like_components(site_map)
+    weights = np.zeros(len(MARKER_KEYS))
+    #every tile of a block of n like markers gets (n-1)*5% of its stats, so a block contributes n*(n-1)*5%
+    for block_size, block_marker in zip(sizes, block_markers):
+        if markers[block_marker].is_terraforming():
+            weights[MARKER_INDEX[block_marker]] += block_size*((block_size-1)*.05)
+    weights.flags.writeable = False
+    return weights
+
+def get_massive_terraforming_bonus(site_map, current_year, sot,klingon, turtle,goths, faultline, sink=NULL_SINK): #pylint: disable=too-many-arguments
     """Calculates the bonus to all stats for multiple contiguous terraforming markers of the same type"""
-    usability_bonus = 0
-    visibility_bonus = 0
-    respectability_bonus = 0
-    likability_bonus = 0
-    understandability_bonus = 0
-    for row_num in range(len(site_map)): #pylint: disable=consider-using-enumerate, too-many-nested-blocks
-        for col_num in range(len(site_map[row_num])):
-            this_marker = site_map[row_num][col_num]
-            this_marker_stats = get_stats_for_marker(this_marker, current_year, sot, klingon, turtle,goths, faultline)
-            if markers[this_marker].is_terraforming():
-                contiguous_markers_in_block = get_like_contiguous_markers(site_map, row_num, col_num)
-                usability_bonus += ((contiguous_markers_in_block-1)*.05)*this_marker_stats[0]
-                visibility_bonus += ((contiguous_markers_in_block-1)*.05)*this_marker_stats[1]
-                respectability_bonus += ((contiguous_markers_in_block-1)*.05)*this_marker_stats[2]
-                likability_bonus += ((contiguous_markers_in_block-1)*.05)*this_marker_stats[3]
-                understandability_bonus += ((contiguous_markers_in_block-1)*.05)*this_marker_stats[4]
+    marker_stats = get_marker_stats(current_year, sot, klingon, turtle, goths, faultline)
+    usability_bonus, visibility_bonus, respectability_bonus, likability_bonus, understandability_bonus = \
+        (get_terraforming_weights(SiteMap.coerce(site_map)) @ marker_stats).tolist()
+
+    if sink.enabled:
+        site_map = SiteMap.coerce(site_map)
+        labels, sizes, _ = get_like_components(site_map)
+        if isinstance(site_map, SparseSiteMap):
+            tiles = zip(site_map.codes.tolist(), labels)
+        else:
+            tiles = zip(site_map.codes.ravel().tolist(), (label for row in labels for label in row))
+        for code, label in tiles:
+            if markers[MARKER_KEYS[code]].is_terraforming():
+                sink.emit("contiguous_markers", count=sizes[label])
 
     return usability_bonus, visibility_bonus, respectability_bonus, likability_bonus, understandability_bonus
 
 def get_pro_educational_adjacency_bonus(site_map):
     """Calculates the site's understandability bonus from markers with pro-educational tag boosting markers with
     the educational tag"""
-    understandability_bonus = 0
-    for row_num in range(len(site_map)): #pylint: disable=consider-using-enumerate, too-many-nested-blocks
-        for col_num in range(len(site_map[row_num])):
-            this_marker = site_map[row_num][col_num]
-            if markers[this_marker].is_pro_educational():
-                neighbors = get_neighbors(site_map, row_num, col_num)
-                for neighbor in neighbors:
-                    if markers[neighbor].is_educational():
-                        understandability_bonus += 1
-
-    return understandability_bonus
+    return get_adjacency_bonuses(site_map, False).pro_educational_understandability
 
 def get_spooky_adjacency_bonus(site_map, goths):
     """Calculates the site's respectability bonus and likability penalty for adjacent markers with the spooky tag"""
-    respectability_bonus = 0
-    likability_penalty = 0
-    for row_num in range(len(site_map)): #pylint: disable=consider-using-enumerate, too-many-nested-blocks
-        for col_num in range(len(site_map[row_num])):
-            this_marker = site_map[row_num][col_num]
-            if markers[this_marker].is_spooky():
-                neighbors = get_neighbors(site_map, row_num, col_num)
-                for neighbor in neighbors:
-                    if markers[neighbor].is_spooky():
-                        respectability_bonus += .5
-                        if goths:
-                            likability_penalty += .5
-                        else:
-                            likability_penalty -= .5
-
-    return respectability_bonus, likability_penalty
+    bonuses = get_adjacency_bonuses(site_map, goths)
+    return bonuses.spooky_respectability, bonuses.spooky_likability
 
 def get_synergy_partnership_bonus(site_map):
     """Calculates the site's understandability bonus from synergy partnerships"""
-    understandability_bonus = 0
-    for row_num in range(len(site_map)): #pylint: disable=consider-using-enumerate, too-many-nested-blocks
-        for col_num in range(len(site_map[row_num])):
-            this_marker = site_map[row_num][col_num]
-            partnerships = markers[this_marker].get_synergy_partnerships()
-            if partnerships:
-                neighbors = get_neighbors(site_map, row_num, col_num)
-                for neighbor in neighbors:
-                    neighbor_partnerships = markers[neighbor].get_synergy_partnerships()
-                    for partnership in partnerships:
-                        if partnership in neighbor_partnerships:
-                            understandability_bonus += .5
-
-    return understandability_bonus
-
-def get_visibility_adjacency_bonus(site_map): #pylint: disable=too-many-branches
-    """Calculate visibility bonus from visibility adjacency bonuses"""
-    neighbors = 0
-    for row_num in range(len(site_map)): #pylint: disable=consider-using-enumerate
-        for tile_num in range(len(site_map[row_num])):
-            tile_tags = markers[site_map[row_num][tile_num]].tags
-            if "adj-bonus" in tile_tags:
-                #left neighbor
-                if tile_num>0:
-                    if "vis-adj-bonus" in markers[site_map[row_num][tile_num-1]].tags:
-                        neighbors += 1
-                #right neighbor
-                if tile_num < len(site_map[row_num]) -1:
-                    if "vis-adj-bonus" in markers[site_map[row_num][tile_num+1]].tags:
-                        neighbors += 1
-                #top neighbor
-                if row_num > 0:
-                    if "vis-adj-bonus" in markers[site_map[row_num-1][tile_num]].tags:
-                        neighbors += 1
-                #bottom neighbor
-                if row_num < len(site_map) -1:
-                    if "vis-adj-bonus" in markers[site_map[row_num+1][tile_num]].tags:
-                        neighbors += 1
-                #top left
-                if tile_num>0 and row_num>0:
-                    if "vis-adj-bonus" in markers[site_map[row_num-1][tile_num-1]].tags:
-                        neighbors += 1
-                #top right
-                if tile_num < len(site_map[row_num]) -1 and row_num>0:
-                    if "vis-adj-bonus" in markers[site_map[row_num-1][tile_num+1]].tags:
-                        neighbors += 1
-                # bottom left
-                if tile_num>0 and row_num < len(site_map) -1:
-                    if "vis-adj-bonus" in markers[site_map[row_num+1][tile_num-1]].tags:
-                        neighbors += 1
-                #bottom right
-                if len(site_map[row_num]) -1 and row_num < len(site_map) -1:
-                    if "vis-adj-bonus" in markers[site_map[row_num+1][tile_num+1]].tags:
-                        neighbors += 1
-
-    return neighbors/2
-
-def miner_prob(knowledge_of_past, value_of_materials, understandability, years): #pylint: disable=too-many-branches
-    """gives probability that a miner digs a bad hole in the given time span"""
-
-    #calculate value_multiplier - probabilistic
-    die = random.random()
-    if value_of_materials == 1: #high value
-        if die <= .19:
-            value_multiplier = .25
-        elif die <= .38:
-            value_multiplier = .5
-        elif die <= .88:
-            value_multiplier = 1
-        elif die <= .94:
-            value_multiplier = 2
-        else:
-            value_multiplier = 4
-    else:
-        if die <= .35:
-            value_multiplier = .01
-        elif die <= .85:
-            value_multiplier = .1
-        elif die <= .925:
-            value_multiplier = .25
-        else:
-            value_multiplier = .5
-    #print("value multiplier is " + str(value_multiplier))
-
-    # calculate knowlege_multiplier - deterministic
-    if knowledge_of_past != 0:
-        knowledge_multiplier = .001*(1-understandability)/1
-    else:
-        knowledge_multiplier = 1
+    return get_adjacency_bonuses(site_map, False).synergy_understandability
 
-    bhr = .001 #magic! was 83 in source, but then you always lose
-
-    #drill rate is the avg # of bores per sq m per 1000 yrs
-    drill_rate = bhr * value_multiplier * knowledge_multiplier
-    #print("drill rate is " + str(drill_rate))
-
-    area = 16 #sqare milage from doc
-
-    prob_per_year = (drill_rate*area)/1000
-    #print("yearly probability is " + str(prob_per_year))
-
-    prob = 1-((1-prob_per_year)**years)
-    #print("total probability of mining is " + str(prob))
-
-    return prob
-
-
-def arch_prob(knowledge_of_past, start_year, understandability):
-    """gives total probability of at least one disruptive archaeological
-    dig over 200 years, given start year"""
-    #should also take state_of_technology?
-    if knowledge_of_past == 3:
-        prob = 0
-    elif knowledge_of_past == 2:
-        if start_year < 3000:
-            prob = 0
-        elif start_year < 5000:
-            prob = .01 * (.5 - understandability)/.5
-        else:
-            prob = .02 * (.5 - understandability)/.5
-    elif knowledge_of_past == 1:
-        if start_year < 3000:
-            prob = .01 * (.5 - understandability)/.5
-        elif start_year < 5000:
-            prob = .02 * (.5 - understandability)/.5
-        else:
-            prob = .03 * (.5 - understandability)/.5
-    else:
-        if start_year < 3000:
-            prob = 0
-        else:
-            prob = .001 * (.5 - understandability)/.5
-
-    return prob
-
-def dam_prob(knowledge_of_past, usability, start_year, understandability):
-    """gives total prob of at least one dam construction over 200 years"""
-    if knowledge_of_past == 3:
-        prob = 0
-    elif start_year < 2300:
-        if usability > .5:
-            prob = .002 * (.5 - understandability)/.5
-        elif usability > 0:
-            prob = .001 * (.5 - understandability)/.5
-        else:
-            prob= .0005
-    elif start_year < 5000:
-        if usability > .51:
-            prob = .003 * (.5 - understandability)/.5
-        elif usability > 0:
-            prob = .002 * (.5 - understandability)/.5
-        else:
-            prob = .0001 * (.5 - understandability)/.5
-    else:
-        if usability > .5:
-            prob = .005 * (.5 - understandability)/.5
-        elif usability > 0:
-            prob = .004 * (.5 - understandability)/.5
-        else:
-            prob = .0003 * (.5 - understandability)/.5
-    return prob
-
-def teen_prob(visibility, respectability, understandability):
-    """gives total prob of random teen violence breaching the site"""
-    if visibility < .3 or respectability > .8:
-        prob = 0
-    elif respectability > .6:
-        prob = .0001 * (1 - understandability)/1
-    elif respectability > .3:
-        prob = .001 * (1 - understandability)/1
-    else:
-        prob = .003 * (1 - understandability)/1
-    return prob
-
-def transit_tunnel_prob(state_of_technology, understandability, visibility):
-    """gives the probability of a transit tunnel being built through the site in a 200 year period"""
-    awareness_of_danger = understandability*visibility
-    base_probability = 0
-    if state_of_technology == LOW_TECH:
-        base_probability = 0
-    elif state_of_technology == MEDIUM_TECH:
-        base_probability = .001
-    else:
-        base_probability = .001
-    return base_probability*(1-awareness_of_danger)
+def get_visibility_adjacency_bonus(site_map):
+    """Calculate visibility bonus from visibility adjacency bonuses"""
+    return get_adjacency_bonuses(site_map, False).visibility
 
 def get_modified_map(time_period_map, vikings, earthquake, faultline):
     """changes map based on 3 events"""
-    new_map = copy.deepcopy(time_period_map)
-    for row_num in range(len(time_period_map)):
-        for col_num in range(len(time_period_map[row_num])):
-            if vikings:
-                if time_period_map[row_num][col_num] == "attractive-monument":
-                    new_map[row_num][col_num] = "ruined-attractive-monument"
-                elif time_period_map[row_num][col_num] == "visitor-center":
-                    new_map[row_num][col_num] = "ruined-visitor-center"
-                elif time_period_map[row_num][col_num] == "atomic-flowers":
-                    new_map[row_num][col_num]= "ruined-atomic-flowers"
-            if earthquake or faultline:
-                if time_period_map[row_num][col_num] == "granite-monolith":
-                    new_map[row_num][col_num] = "ruined-granite-monolith"
-                elif time_period_map[row_num][col_num] == "metal-monolith":
-                    new_map[row_num][col_num] = "ruined-metal-monolith"
-                elif time_period_map[row_num][col_num] == "wooden-monolith":
-                    new_map[row_num][col_num] = "ruined-wooden-monolith"
-    return new_map
+    replacements = {}
+    if vikings:
+        replacements.update(VIKINGS_REPLACEMENTS)
+    if earthquake or faultline:
+        replacements.update(EARTHQUAKE_REPLACEMENTS)
+    return SiteMap.coerce(time_period_map).replace_markers(replacements)
@@ -43,7 +43,7 @@ class SimulationScreen:
         if self.current_event_index >= len(self.events_from_simulation):
             self.done = True
             return
-        self.current_map.map = self.maps_from_simulation[self.current_event_index]
+        self.current_map.map = self.maps_from_simulation[self.current_event_index].to_names()
         self.current_map.update(player, is_simulation=True)
 
     def draw(self, player):
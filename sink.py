@@ -0,0 +1,81 @@
+"""Defines event sinks, which receive the progress messages emitted while a simulation runs. Callers check
+`sink.enabled` before building an event, so a disabled sink costs nothing per trial"""
+
+#console wording for each kind of event, in the format the simulation has always printed
+MESSAGES = {
+    "epoch_start": "Simulating to {year}",
+    "state_of_tech": "state of tech is {sot}",
+    "event": "In the year {year}, {event} happened!",
+    "stats": "usability, visibility, respectability, likability, understandability:\n"
+             "{usability} {visibility} {respectability} {likability} {understandability}",
+    "knowledge_of_past": "knowledge of past is {kop}",
+    "value_of_materials": "value of materials is {vom}",
+    "event_roll": "bad cult? {bad_cult}\ncurrent year: {year}\n{die}\nmet dig conditions: {dig_conditions}",
+    "cult_dig": "cult dig!!!",
+    "pre_normalization_stats": "Pre-normalization understandability:  {understandability}  visibility:  "
+                               "{visibility}  respectability:  {respectability}  likability:  {likability}  "
+                               "usability:  {usability}",
+    "contiguous_markers": "{count}",
+}
+
+#console wording for the probability, breach and survival messages of each hazard
+HAZARD_MESSAGES = {
+    "mining": ("{years} year probability of mining is {prob}",
+               "I rolled {die}, so mining did happen in year {year}",
+               "I rolled {die}, so no mining happened by year {year}"),
+    "archaeology": ("{years} year probability of archaeologists is {prob}",
+                    "I rolled {die}, so archaeology did happen in year {year}",
+                    "I rolled {die}, so no archaeology happened by year {year}"),
+    "dams": ("{years} year probability of dam builders is {prob}",
+             "I rolled {die}, so dam bulidng did happen in year {year}",
+             "I rolled {die}, so no dam building happened by year {year}"),
+    "teens": ("{years} year probability of teens is {prob}",
+              "I rolled {die}, so teens did happen in year {year}",
+              "I rolled {die}, so no teens happened by year {year}"),
+    "tunnels": ("{years} year probability of transit tunnel is {prob}",
+                "I rolled {die}, so a transit tunnel breached the site in year {year}",
+                "I rolled {die}, so no transit tunnel disrupted the site by year {year}"),
+}
+
+def format_event(kind, fields):
+    """Returns the console wording of an event"""
+    if kind.startswith("hazard_"):
+        probability_message, breached_message, survived_message = HAZARD_MESSAGES[fields["hazard"]]
+        if kind == "hazard_probability":
+            return probability_message.format(**fields)
+        if kind == "hazard_breached":
+            return breached_message.format(**fields)
+        return survived_message.format(**fields)
+    return MESSAGES[kind].format(**fields)
+
+class NullSink:
+    """Discards every event. The default for headless and batch runs"""
+    enabled = False
+
+    def emit(self, kind, **fields):
+        """Discards an event"""
+
+class RecordingSink:
+    """Keeps every event as a (kind, fields) tuple, for debugging"""
+    enabled = True
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, kind, **fields):
+        """Records an event"""
+        self.events.append((kind, fields))
+
+    def of_kind(self, kind):
+        """Returns the fields of every recorded event of the given kind"""
+        return [fields for event_kind, fields in self.events if event_kind == kind]
+
+class ConsoleSink:
+    """Prints every event with the simulation's verbose console wording"""
+    enabled = True
+
+    def emit(self, kind, **fields):
+        """Prints an event"""
+        print(format_event(kind, fields))
+
+NULL_SINK = NullSink()
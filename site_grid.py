@@ -0,0 +1,281 @@
+"""Defines SiteMap, a compact, hashable site map backed by an array of marker codes, and SparseSiteMap, which stores
+only the occupied tiles of a map of any size. Codes are indices into marker.get_marker_keys(), so they are stable for
+as long as the marker list is"""
+
+import numpy as np
+from marker_table import MARKER_KEYS, MARKER_INDEX
+
+CODE_DTYPE = np.uint8 if len(MARKER_KEYS) <= 256 else np.uint16
+EMPTY_CODE = MARKER_INDEX["null"]
+NEIGHBOR_OFFSETS = tuple((row_offset, col_offset) for row_offset in (-1, 0, 1) for col_offset in (-1, 0, 1)
+                         if row_offset or col_offset)
+
+class SiteMap:
+    """An immutable grid of marker codes. Reads like the legacy list-of-lists site map, so site_map[row][col] and
+    iterating over rows of marker names still work"""
+    def __init__(self, codes):
+        self.codes = np.array(codes, dtype=CODE_DTYPE)
+        self.codes.flags.writeable = False
+
+    @classmethod
+    def from_names(cls, rows):
+        """Builds a SiteMap from a legacy list of rows of marker names"""
+        return cls([[MARKER_INDEX[tile] for tile in row] for row in rows])
+
+    @classmethod
+    def coerce(cls, site_map):
+        """Returns the site map as a SiteMap, converting it if it is in legacy list form. SparseSiteMaps are
+        returned as they are, since the simulation reads both alike"""
+        if isinstance(site_map, (cls, SparseSiteMap)):
+            return site_map
+        return cls.from_names(site_map)
+
+    def to_names(self):
+        """Returns the site map as a legacy list of rows of marker names"""
+        return [[MARKER_KEYS[code] for code in row] for row in self.codes.tolist()]
+
+    @property
+    def shape(self):
+        """The number of rows and columns in the map"""
+        return self.codes.shape
+
+    def copy(self):
+        """Returns a snapshot of the map"""
+        return SiteMap(self.codes)
+
+    def with_tile(self, row_num, col_num, marker_id):
+        """Returns a copy of the map with one tile replaced"""
+        codes = self.codes.copy()
+        codes[row_num, col_num] = MARKER_INDEX[marker_id]
+        return SiteMap(codes)
+
+    def replace_markers(self, replacements):
+        """Returns a copy of the map with every marker in the replacements dict swapped for its value. Replacements
+        of markers that are not in the code table can never match a tile and are ignored"""
+        lookup = np.arange(len(MARKER_KEYS), dtype=CODE_DTYPE)
+        for old_marker, new_marker in replacements.items():
+            if old_marker in MARKER_INDEX:
+                lookup[MARKER_INDEX[old_marker]] = MARKER_INDEX[new_marker]
+        return SiteMap(lookup[self.codes])
+
+    def marker_counts(self):
+        """Returns how many times each marker appears on the map, indexed by marker code"""
+        return np.bincount(self.codes.ravel(), minlength=len(MARKER_KEYS))
+
+    def get_changes_from(self, previous):
+        """Returns (rows, cols, old codes, new codes) arrays of the tiles that differ from a previous map"""
+        rows, cols = np.nonzero(self.codes != previous.codes)
+        return rows, cols, previous.codes[rows, cols], self.codes[rows, cols]
+
+    def with_changes(self, rows, cols, new_codes):
+        """Returns a copy of the map with the given tiles set to new codes"""
+        codes = self.codes.copy()
+        codes[rows, cols] = new_codes
+        return SiteMap(codes)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, row_num):
+        return [MARKER_KEYS[code] for code in self.codes[row_num].tolist()]
+
+    def __iter__(self):
+        return iter(self.to_names())
+
+    def __eq__(self, other):
+        if not isinstance(other, SiteMap):
+            return NotImplemented
+        return self.codes.shape == other.codes.shape and bool(np.array_equal(self.codes, other.codes))
+
+    def __hash__(self):
+        return hash((self.codes.shape, self.codes.tobytes()))
+
+class SparseSiteMap: #pylint: disable=too-many-public-methods
+    """An immutable site map of any size that stores only its occupied tiles, as sorted row-major tile keys and their
+    marker codes. Every other tile is empty ("null"). Reads like SiteMap, so the simulation runs on either, and its
+    marker counts, adjacency bonuses and block labels cost time in proportion to the number of occupied tiles"""
+    def __init__(self, shape, keys, codes):
+        self.shape = (int(shape[0]), int(shape[1]))
+        keys = np.asarray(keys, dtype=np.int64).ravel()
+        codes = np.asarray(codes, dtype=CODE_DTYPE).ravel()
+        order = np.argsort(keys, kind="stable")
+        keys, codes = keys[order], codes[order]
+        last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.zeros(0, dtype=bool) #later tiles win
+        occupied = last & (codes != EMPTY_CODE)
+        self.keys = keys[occupied]
+        self.codes = codes[occupied]
+        self.keys.flags.writeable = False
+        self.codes.flags.writeable = False
+        self.rows, self.cols = np.divmod(self.keys, self.shape[1])
+        self.neighbors = None
+
+    @classmethod
+    def from_tiles(cls, shape, tiles):
+        """Builds a map from a dict of (row, col) -> marker name"""
+        keys = [row_num*shape[1] + col_num for row_num, col_num in tiles]
+        return cls(shape, keys, [MARKER_INDEX[tile] for tile in tiles.values()])
+
+    @classmethod
+    def from_names(cls, rows):
+        """Builds a map from a legacy list of rows of marker names"""
+        return cls.from_dense(SiteMap.from_names(rows))
+
+    @classmethod
+    def from_dense(cls, site_map):
+        """Builds a map holding the occupied tiles of a SiteMap"""
+        codes = site_map.codes.ravel()
+        keys = np.flatnonzero(codes != EMPTY_CODE)
+        return cls(site_map.shape, keys, codes[keys])
+
+    @classmethod
+    def coerce(cls, site_map):
+        """Returns the site map as a SparseSiteMap, converting it if it is a SiteMap or in legacy list form"""
+        if isinstance(site_map, cls):
+            return site_map
+        return cls.from_dense(SiteMap.coerce(site_map))
+
+    def to_dense(self):
+        """Returns the map as a SiteMap"""
+        codes = np.full(self.shape[0]*self.shape[1], EMPTY_CODE, dtype=CODE_DTYPE)
+        codes[self.keys] = self.codes
+        return SiteMap(codes.reshape(self.shape))
+
+    def to_names(self):
+        """Returns the map as a legacy list of rows of marker names"""
+        return self.to_dense().to_names()
+
+    def copy(self):
+        """Returns a snapshot of the map"""
+        return SparseSiteMap(self.shape, self.keys, self.codes)
+
+    def get_codes_at(self, keys):
+        """Returns the code of each tile key, EMPTY_CODE for tiles that are not stored"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self.keys):
+            return np.full(keys.shape, EMPTY_CODE, dtype=CODE_DTYPE)
+        indices = np.minimum(np.searchsorted(self.keys, keys), len(self.keys)-1)
+        return np.where(self.keys[indices] == keys, self.codes[indices], EMPTY_CODE).astype(CODE_DTYPE)
+
+    def get_tile(self, row_num, col_num):
+        """Returns the marker name at a tile"""
+        return MARKER_KEYS[int(self.get_codes_at(row_num*self.shape[1] + col_num))]
+
+    def with_tile(self, row_num, col_num, marker_id):
+        """Returns a copy of the map with one tile replaced"""
+        return self.with_changes([row_num], [col_num], [MARKER_INDEX[marker_id]])
+
+    def with_changes(self, rows, cols, new_codes):
+        """Returns a copy of the map with the given tiles set to new codes"""
+        keys = np.asarray(rows, dtype=np.int64)*self.shape[1] + np.asarray(cols, dtype=np.int64)
+        return SparseSiteMap(self.shape, np.concatenate([self.keys, keys]),
+                             np.concatenate([self.codes, np.asarray(new_codes, dtype=CODE_DTYPE)]))
+
+    def get_changes_from(self, previous):
+        """Returns (rows, cols, old codes, new codes) arrays of the tiles that differ from a previous map"""
+        keys = np.union1d(self.keys, previous.keys)
+        old_codes, new_codes = previous.get_codes_at(keys), self.get_codes_at(keys)
+        changed = old_codes != new_codes
+        rows, cols = np.divmod(keys[changed], self.shape[1])
+        return rows, cols, old_codes[changed], new_codes[changed]
+
+    def replace_markers(self, replacements):
+        """Returns a copy of the map with every marker in the replacements dict swapped for its value. Replacements
+        of markers that are not in the code table can never match a tile and are ignored"""
+        lookup = np.arange(len(MARKER_KEYS), dtype=CODE_DTYPE)
+        for old_marker, new_marker in replacements.items():
+            if old_marker in MARKER_INDEX:
+                lookup[MARKER_INDEX[old_marker]] = MARKER_INDEX[new_marker]
+        return SparseSiteMap(self.shape, self.keys, lookup[self.codes])
+
+    def marker_counts(self):
+        """Returns how many times each marker appears on the map, indexed by marker code"""
+        counts = np.bincount(self.codes, minlength=len(MARKER_KEYS))
+        counts[EMPTY_CODE] += self.shape[0]*self.shape[1] - len(self.codes)
+        return counts
+
+    def get_neighbors(self):
+        """Returns an (8, tiles) array holding, for each occupied tile and each of NEIGHBOR_OFFSETS, the index of the
+        occupied neighbor at that offset, or -1. Computed once per map"""
+        if self.neighbors is None:
+            neighbors = np.full((len(NEIGHBOR_OFFSETS), len(self.keys)), -1, dtype=np.int64)
+            for offset_num, (row_offset, col_offset) in enumerate(NEIGHBOR_OFFSETS):
+                rows, cols = self.rows + row_offset, self.cols + col_offset
+                on_map = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+                keys = rows*self.shape[1] + cols
+                indices = np.minimum(np.searchsorted(self.keys, keys), len(self.keys)-1)
+                found = on_map & (self.keys[indices] == keys)
+                neighbors[offset_num] = np.where(found, indices, -1)
+            neighbors.flags.writeable = False
+            self.neighbors = neighbors
+        return self.neighbors
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, row_num):
+        keys = row_num*self.shape[1] + np.arange(self.shape[1])
+        return [MARKER_KEYS[code] for code in self.get_codes_at(keys).tolist()]
+
+    def __iter__(self):
+        return (self[row_num] for row_num in range(self.shape[0]))
+
+    def __eq__(self, other):
+        if not isinstance(other, SparseSiteMap):
+            return NotImplemented
+        return self.shape == other.shape and bool(np.array_equal(self.keys, other.keys)) and \
+            bool(np.array_equal(self.codes, other.codes))
+
+    def __hash__(self):
+        return hash((self.shape, self.keys.tobytes(), self.codes.tobytes()))
+
+class MapHistory:
+    """The site map after each event of a simulation, stored as the base layout plus the tiles each event changed.
+    Indexing rebuilds the snapshot for that event number"""
+    def __init__(self, base_map):
+        self.base = SiteMap.coerce(base_map)
+        self.latest = self.base
+        self.deltas = [] #(rows, cols, old codes, new codes) arrays per snapshot after the base, None if unchanged
+        self.cached_snapshot = (0, self.base)
+
+    def append(self, site_map):
+        """Records the next snapshot, keeping only the tiles that differ from the previous one"""
+        site_map = SiteMap.coerce(site_map)
+        if site_map is self.latest or site_map == self.latest:
+            self.deltas.append(None)
+        else:
+            self.deltas.append(site_map.get_changes_from(self.latest))
+        self.latest = site_map
+
+    def get_changes(self, index):
+        """Returns the (row, col, old marker, new marker) tiles that changed going into snapshot `index`"""
+        delta = self.deltas[index-1] if index > 0 else None
+        if delta is None:
+            return []
+        rows, cols, old_codes, new_codes = delta
+        return [(int(row), int(col), MARKER_KEYS[old], MARKER_KEYS[new])
+                for row, col, old, new in zip(rows, cols, old_codes, new_codes)]
+
+    def __len__(self):
+        return len(self.deltas) + 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("map history index out of range")
+        cached_index, cached_map = self.cached_snapshot
+        if cached_index == index:
+            return cached_map
+        if cached_index < index:
+            start, snapshot = cached_index, cached_map
+        else:
+            start, snapshot = 0, self.base
+        for delta in self.deltas[start:index]:
+            if delta is not None:
+                rows, cols, _, new_codes = delta
+                snapshot = snapshot.with_changes(rows, cols, new_codes)
+        self.cached_snapshot = (index, snapshot)
+        return snapshot
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
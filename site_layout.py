@@ -0,0 +1,75 @@
+"""Map placement logic shared by the game's Map and headless tools. Needs no pyxel, so it can be imported by worker
+processes and on servers without a display"""
+
+from marker import markers
+from site_grid import SparseSiteMap
+
+MAP_ROWS = 12
+MAP_COLS = 16
+EMPTY_TILES = ("null", "site") #tiles that hold no marker
+
+#kinds of adjacency bonus the map outlines, checked in this order
+SPOOKY_BONUS = "spooky"
+EDUCATIONAL_BONUS = "educational"
+SIGN_BONUS = "danger-sign"
+BURIED_BONUS = "buried-magnets"
+TERRAFORMING_BONUS = "terraforming"
+MONOLITH_BONUS = "monolith"
+
+def get_site_tiles(rows=MAP_ROWS, cols=MAP_COLS):
+    """Returns the (row, col) of the four tiles of the waste site itself, in the middle of a map"""
+    return tuple((row_num, col_num) for row_num in (rows//2 - 1, rows//2) for col_num in (cols//2 - 1, cols//2))
+
+SITE_TILES = get_site_tiles()
+
+def get_blank_map(rows=MAP_ROWS, cols=MAP_COLS):
+    """Returns the starting map as a list of rows of marker names: empty apart from the four site tiles"""
+    site_map = [["null"]*cols for _ in range(rows)]
+    for row_num, col_num in get_site_tiles(rows, cols):
+        site_map[row_num][col_num] = "site"
+    return site_map
+
+def get_blank_sparse_map(rows, cols):
+    """Returns the starting map of a site of any size as a SparseSiteMap"""
+    return SparseSiteMap.from_tiles((rows, cols), {tile: "site" for tile in get_site_tiles(rows, cols)})
+
+def is_in_bounds(row_num, col_num, rows=MAP_ROWS, cols=MAP_COLS):
+    """Returns true if the coordinates are on a map of the given size"""
+    return 0 <= row_num < rows and 0 <= col_num < cols
+
+def get_pair_bonuses(marker_id, neighbor_id):
+    """Returns the kinds of adjacency bonus a marker placed next to a neighbor takes part in"""
+    tags = markers[marker_id].tags
+    neighbor_tags = markers[neighbor_id].tags
+    bonuses = []
+    if "spooky" in tags and "spooky" in neighbor_tags:
+        bonuses.append(SPOOKY_BONUS)
+    if ("pro-educational" in tags and "educational" in neighbor_tags) or \
+       ("educational" in tags and "pro-educational" in neighbor_tags):
+        bonuses.append(EDUCATIONAL_BONUS)
+    if {marker_id, neighbor_id} == {"danger-sign", "disgust-faces"}:
+        bonuses.append(SIGN_BONUS)
+    if {marker_id, neighbor_id} == {"buried-magnets", "menacing-earthworks"}:
+        bonuses.append(BURIED_BONUS)
+    if "terraforming" in tags and marker_id == neighbor_id:
+        bonuses.append(TERRAFORMING_BONUS)
+    if "monolith" in tags and "monolith" in neighbor_tags:
+        bonuses.append(MONOLITH_BONUS)
+    return bonuses
+
+def get_placement_bonuses(site_map, row_num, col_num, marker_id):
+    """Returns (neighbor row, neighbor col, bonus kind) for every adjacency bonus gained by placing a marker at the
+    given tile of a map in list-of-rows form"""
+    bonuses = []
+    for row_offset in range(-1, 2):
+        for col_offset in range(-1, 2):
+            neighbor_row, neighbor_col = row_num+row_offset, col_num+col_offset
+            if (row_offset == 0 and col_offset == 0) or \
+               not is_in_bounds(neighbor_row, neighbor_col, len(site_map), len(site_map[0])):
+                continue
+            neighbor_id = site_map[neighbor_row][neighbor_col]
+            if neighbor_id in EMPTY_TILES:
+                continue
+            for bonus in get_pair_bonuses(marker_id, neighbor_id):
+                bonuses.append((neighbor_row, neighbor_col, bonus))
+    return bonuses
@@ -0,0 +1,22 @@
+"""Derives independent, reproducible random streams for simulation trials from a root seed. Trial n's stream is the
+nth child of the root SeedSequence, so it does not depend on how trials are split between workers"""
+
+import random
+import numpy as np
+
+def new_root_seed():
+    """Returns a fresh root seed drawn from the operating system's entropy"""
+    return np.random.SeedSequence().entropy
+
+def get_trial_seed_sequence(root_seed, trial):
+    """Returns the SeedSequence of a trial, equal to SeedSequence(root_seed).spawn(trial+1)[trial]"""
+    return np.random.SeedSequence(root_seed, spawn_key=(trial,))
+
+def get_trial_rng(root_seed, trial):
+    """Returns a random.Random for simulate.simulate that replays the given trial bit for bit"""
+    return random.Random(int.from_bytes(get_trial_seed_sequence(root_seed, trial).generate_state(4).tobytes(),
+                                        "little"))
+
+def get_trial_generator(root_seed, trial):
+    """Returns a NumPy Generator seeded from the given trial's stream"""
+    return np.random.default_rng(get_trial_seed_sequence(root_seed, trial))
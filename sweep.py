@@ -0,0 +1,216 @@
+"""Runs batched simulations of many site layouts from the command line and streams one result record per layout and
+horizon as NDJSON or CSV. Layouts are read from files or stdin, either as JSON objects with a "layout" grid of marker
+names and optional "name" and "global_buffs", one per line or in a list, or as text blocks:
+
+    name: ringed
+    buffs: ray-cats satellites
+    <12 rows of 16 whitespace-separated marker names>
+
+with blocks separated by blank lines and # starting a comment"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+from marker import markers
+from site_layout import MAP_ROWS, MAP_COLS
+from batch import MARGIN_KEYS, BatchResult, run_trials, split_trials
+from vector_simulate import HAZARD_EVENTS, INSTAKILL_EVENTS, simulate_batch
+from streams import new_root_seed
+from simulate import EPOCH_YEARS, EPOCH_LENGTHS
+
+ENGINES = ("scalar", "vector")
+FORMATS = ("ndjson", "csv")
+BREACH_CAUSES = HAZARD_EVENTS + INSTAKILL_EVENTS
+
+@dataclass
+class SweepEntry:
+    """One layout to simulate"""
+    name: str
+    layout: list #rows of marker names
+    global_buffs: list
+
+def check_layout(name, layout, global_buffs):
+    """Raises ValueError if a layout is not a MAP_ROWS x MAP_COLS grid of known markers or a buff is unknown"""
+    if len(layout) != MAP_ROWS or any(len(row) != MAP_COLS for row in layout):
+        raise ValueError(f"layout {name} is not a {MAP_ROWS}x{MAP_COLS} grid")
+    unknown = sorted({tile for row in layout for tile in row if tile not in markers} |
+                     {buff for buff in global_buffs if buff not in markers})
+    if unknown:
+        raise ValueError(f"layout {name} uses unknown markers: {', '.join(unknown)}")
+
+def parse_json_entries(lines, source, default_buffs):
+    """Yields a SweepEntry for each JSON object of an NDJSON stream, or of a JSON list if the stream is one"""
+    first = next(lines, None)
+    if first is None:
+        return
+    if first.lstrip().startswith("["):
+        objects = json.loads(first + "".join(lines))
+    else:
+        objects = (json.loads(line) for line in chain([first], lines) if line.strip())
+    for index, obj in enumerate(objects):
+        name = obj.get("name", f"{source}:{index}")
+        entry = SweepEntry(name, obj["layout"], obj.get("global_buffs", default_buffs))
+        check_layout(entry.name, entry.layout, entry.global_buffs)
+        yield entry
+
+def parse_text_entries(lines, source, default_buffs):
+    """Yields a SweepEntry for each blank-line-separated text block of a stream"""
+    block = []
+    index = 0
+    for line in chain(lines, [""]):
+        line = line.split("#", 1)[0].strip()
+        if line:
+            block.append(line)
+            continue
+        if not block:
+            continue
+        name, buffs, layout = f"{source}:{index}", default_buffs, []
+        for block_line in block:
+            if block_line.startswith("name:"):
+                name = block_line[len("name:"):].strip()
+            elif block_line.startswith("buffs:"):
+                buffs = block_line[len("buffs:"):].split()
+            else:
+                layout.append(block_line.split())
+        check_layout(name, layout, buffs)
+        yield SweepEntry(name, layout, buffs)
+        block = []
+        index += 1
+
+def read_entries(file, source, default_buffs):
+    """Yields the layouts of an open file one at a time, detecting whether it holds JSON or text blocks"""
+    lines = iter(file)
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        parse = parse_json_entries if stripped[0] in "[{" else parse_text_entries
+        yield from parse(chain([line], lines), source, default_buffs)
+        return
+
+def run_sweep(entries, years, trials, workers=1, seed=None, engine="scalar", epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Yields (entry, years, BatchResult) for every entry and horizon, in input order. The scalar engine spreads each
+    layout's trials over a process pool kept busy with the next few layouts; the vector engine runs each layout in
+    one vectorized pass in this process. Every layout draws from the same seed, so results of different layouts are
+    compared on common random numbers"""
+    if seed is None:
+        seed = new_root_seed()
+    if engine == "vector":
+        for entry in entries:
+            for horizon in years:
+                yield entry, horizon, simulate_batch(horizon, entry.layout, entry.global_buffs, trials,
+                                                     np.random.default_rng(seed), epoch_years)
+        return
+    if workers <= 1:
+        for entry in entries:
+            for horizon in years:
+                yield entry, horizon, run_trials(entry.layout, entry.global_buffs, horizon, trials, seed,
+                                                 epoch_years=epoch_years)
+        return
+
+    chunk_sizes = split_trials(trials, workers)
+    chunk_starts = [sum(chunk_sizes[:i]) for i in range(len(chunk_sizes))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for entry in entries:
+            for horizon in years:
+                pending.append((entry, horizon, [pool.submit(run_trials, entry.layout, entry.global_buffs, horizon,
+                                                             size, seed, start, epoch_years)
+                                                 for size, start in zip(chunk_sizes, chunk_starts)]))
+            while len(pending) > workers: #bound the layouts in flight so the input is read lazily
+                yield collect(*pending.popleft())
+        while pending:
+            yield collect(*pending.popleft())
+
+def collect(entry, horizon, futures):
+    """Merges the chunk results of one layout's trials"""
+    result = BatchResult()
+    for future in futures:
+        result.merge(future.result())
+    return entry, horizon, result
+
+def get_record(entry, years, result, seed, confidence=.95, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Returns the flat result record of one layout and horizon"""
+    low, high = result.confidence_interval(confidence)
+    record = {"name": entry.name, "years": years, "epoch_years": epoch_years, "trials": result.trials, "seed": seed,
+              "survival_rate": result.survival_rate(), "survival_low": low, "survival_high": high,
+              "breaches": result.breaches}
+    for cause in BREACH_CAUSES:
+        record[f"breaches_{cause}"] = result.breach_counts.get(cause, 0)
+    for key in MARGIN_KEYS:
+        margins = result.margins[key]
+        record[f"margin_mean_{key}"] = float(np.mean(margins)) if margins else None
+        record[f"margin_min_{key}"] = float(np.min(margins)) if margins else None
+    return record
+
+def get_fields():
+    """Returns the CSV columns of a result record, in order"""
+    return (["name", "years", "epoch_years", "trials", "seed", "survival_rate", "survival_low", "survival_high",
+             "breaches"] +
+            [f"breaches_{cause}" for cause in BREACH_CAUSES] +
+            [f"margin_{stat}_{key}" for key in MARGIN_KEYS for stat in ("mean", "min")])
+
+def write_records(records, out, output_format):
+    """Writes each record as soon as it arrives, flushing after every one"""
+    if output_format == "csv":
+        writer = csv.DictWriter(out, fieldnames=get_fields())
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(record):
+            out.write(json.dumps(record) + "\n")
+    for record in records:
+        write(record)
+        out.flush()
+
+def iter_sources(paths, default_buffs):
+    """Yields the layouts of every input path in turn, with - meaning stdin"""
+    for path in paths or ["-"]:
+        if path == "-":
+            yield from read_entries(sys.stdin, "stdin", default_buffs)
+        else:
+            with open(path, encoding="utf-8") as file:
+                yield from read_entries(file, path, default_buffs)
+
+def main(argv=None):
+    """Runs a sweep from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="layout files; - or none reads stdin")
+    parser.add_argument("--years", type=int, nargs="+", default=[10000], help="simulation horizons")
+    parser.add_argument("--trials", type=int, default=1000, help="trials per layout and horizon")
+    parser.add_argument("--buffs", nargs="*", default=[], help="global buffs for layouts that name none")
+    parser.add_argument("--engine", choices=ENGINES, default="scalar")
+    parser.add_argument("--epoch-years", type=int, choices=EPOCH_LENGTHS, default=EPOCH_YEARS,
+                        help="years simulated per step")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for the scalar engine")
+    parser.add_argument("--seed", type=int, help="root seed; drawn fresh and reported in each record if omitted")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--confidence", type=float, default=.95, help="confidence of the survival interval")
+    parser.add_argument("--output", help="write records here instead of stdout")
+    args = parser.parse_args(argv)
+
+    seed = new_root_seed() if args.seed is None else args.seed
+    entries = iter_sources(args.inputs, args.buffs)
+    results = run_sweep(entries, args.years, args.trials, args.workers, seed, args.engine, args.epoch_years)
+    records = (get_record(entry, years, result, seed, args.confidence, args.epoch_years)
+               for entry, years, result in results)
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout #pylint: disable=consider-using-with
+    try:
+        write_records(records, out, args.format)
+    except (ValueError, KeyError) as error:
+        print(f"sweep: {error}", file=sys.stderr)
+        return 2
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
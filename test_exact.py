@@ -0,0 +1,47 @@
+"""Checks the exact engine against seeded runs of simulate.simulate"""
+
+import math
+import bench
+from batch import run_trials, get_wilson_interval
+from exact import simulate_exact
+from simulate import EPOCH_LENGTHS
+
+YEARS = 2000
+SEED = 1234
+Z_SCORE = 4 #seeded runs are repeatable, so a wide band only guards against a lucky seed hiding a bias
+SWEEP_TRIALS = 1000 #sweep.py's default --trials
+
+LAYOUTS = ("spooky-clusters", "monolith-heavy")
+BUFF_SETS = (list(bench.BUFFS), list(bench.BUFFS) + ["bad-cult"])
+
+def get_cases():
+    """Yields (layout, buffs) pairs covering hazard-driven and event-driven breaches"""
+    for name in LAYOUTS:
+        for buffs in BUFF_SETS:
+            yield bench.LAYOUTS[name](), buffs
+
+def assert_within(estimate, exact, trials, standard_error=None):
+    """Fails unless a Monte Carlo estimate lies within Z_SCORE standard errors of the exact probability"""
+    if standard_error is None:
+        standard_error = math.sqrt(max(exact*(1-exact), 1/trials) / trials)
+    assert abs(estimate - exact) <= Z_SCORE * standard_error, (estimate, exact, standard_error)
+
+def test_scalar_matches_exact():
+    trials = 1500
+    for layout, buffs in get_cases():
+        exact = simulate_exact(YEARS, layout, buffs).breach_probability
+        result = run_trials(layout, buffs, YEARS, trials, SEED)
+        assert_within(result.breaches / trials, exact, trials)
+
+def test_step_length_converges():
+    #with bad-cult, the cult dig possible from year 3000 ends most runs by this horizon, so the event odds dominate
+    years = 1400
+    layout, buffs = bench.LAYOUTS["spooky-clusters"](), BUFF_SETS[1]
+    rates = {epoch_years: simulate_exact(years, layout, buffs, epoch_years=epoch_years).survival_rate()
+             for epoch_years in EPOCH_LENGTHS}
+    reference = rates[min(EPOCH_LENGTHS)]
+    errors = [abs(rates[epoch_years] - reference) for epoch_years in sorted(EPOCH_LENGTHS)]
+    assert errors == sorted(errors), rates
+    #a coarser step may only move the answer by less than a default sweep can resolve
+    low, high = get_wilson_interval(reference, SWEEP_TRIALS)
+    assert errors[-1] < (high - low) / 2, rates
@@ -0,0 +1,126 @@
+"""Checks the compiled hazard tables against the branch ladders they replaced"""
+
+import itertools
+import math
+import numpy as np
+from hazards import HAZARD_MODEL, FEATURES
+
+#the ladders simulate.py used before the hazards were declared as data, kept as the reference
+def miner_prob(knowledge_of_past, value_of_materials, understandability, years, die):
+    """Chance of a bad bore in `years`, given the value die"""
+    if value_of_materials == 1:
+        steps = ((.19, .25), (.38, .5), (.88, 1), (.94, 2), (1, 4))
+    else:
+        steps = ((.35, .01), (.85, .1), (.925, .25), (1, .5))
+    value_multiplier = next(multiplier for limit, multiplier in steps if die <= limit)
+    knowledge_multiplier = .001*(1-understandability) if knowledge_of_past != 0 else 1
+    prob_per_year = .001 * value_multiplier * knowledge_multiplier * 16 / 1000
+    return 1-((1-prob_per_year)**years)
+
+def arch_prob(knowledge_of_past, start_year, understandability):
+    """Chance of a disruptive dig in 200 years"""
+    scale = (.5 - understandability)/.5
+    if knowledge_of_past == 3:
+        return 0
+    if knowledge_of_past == 2:
+        return 0 if start_year < 3000 else (.01 if start_year < 5000 else .02) * scale
+    if knowledge_of_past == 1:
+        return (.01 if start_year < 3000 else .02 if start_year < 5000 else .03) * scale
+    return 0 if start_year < 3000 else .001 * scale
+
+def dam_prob(knowledge_of_past, usability, start_year, understandability):
+    """Chance of a dam in 200 years"""
+    scale = (.5 - understandability)/.5
+    if knowledge_of_past == 3:
+        return 0
+    if start_year < 2300:
+        return .002*scale if usability > .5 else .001*scale if usability > 0 else .0005
+    if start_year < 5000:
+        return .003*scale if usability > .51 else .002*scale if usability > 0 else .0001*scale
+    return .005*scale if usability > .5 else .004*scale if usability > 0 else .0003*scale
+
+def teen_prob(visibility, respectability, understandability):
+    """Chance of teens breaching the site in 200 years"""
+    if visibility < .3 or respectability > .8:
+        return 0
+    if respectability > .6:
+        return .0001 * (1 - understandability)
+    if respectability > .3:
+        return .001 * (1 - understandability)
+    return .003 * (1 - understandability)
+
+def transit_tunnel_prob(state_of_technology, understandability, visibility):
+    """Chance of a transit tunnel through the site in 200 years"""
+    return (.001 if state_of_technology > 0 else 0) * (1 - understandability*visibility)
+
+#values on and either side of every threshold the ladders test
+KOPS = (0, 1, 2, 3)
+START_YEARS = (1800, 2000, 2299, 2300, 2301, 2999, 3000, 4999, 5000, 9800)
+USABILITIES = (-.5, 0, 1e-9, .3, .5, .500001, .51, .510001, .9)
+VISIBILITIES = (0, .2, .299, .3, .5, 1)
+RESPECTABILITIES = (-.2, 0, .3, .300001, .6, .600001, .8, .800001, 1)
+VALUE_DICE = (0, .19, .190001, .35, .38, .5, .85, .88, .9, .925, .94, .95, .999999)
+UNDERSTANDABILITIES = (-.3, 0, .2, .5, .8, 1)
+
+def get_probabilities(years=200, **features):
+    """Returns HAZARD_MODEL's odds of each hazard by name, with unnamed features left at middling values"""
+    values = {"kop": 0, "start_year": 4000, "usability": .3, "visibility": .5, "respectability": .4, "sot": 1,
+              "vom": 0, "value_die": .5}
+    understandability = features.pop("understandability")
+    values.update(features)
+    probs = HAZARD_MODEL.get_probabilities(tuple(values[feature] for feature in FEATURES), understandability, years)
+    return dict(zip(HAZARD_MODEL.names, probs))
+
+def assert_close(actual, expected):
+    """Fails unless two probabilities agree to rounding"""
+    assert math.isclose(actual, expected, rel_tol=1e-12, abs_tol=1e-15), (actual, expected)
+
+def test_mining_matches_ladder():
+    for kop, vom, die, understandability, years in itertools.product(KOPS, (0, 1), VALUE_DICE, UNDERSTANDABILITIES,
+                                                                    (1, 10, 200)):
+        probs = get_probabilities(years, kop=kop, vom=vom, value_die=die, understandability=understandability)
+        assert_close(probs["mining"], miner_prob(kop, vom, understandability, years, die))
+
+def test_archaeology_matches_ladder():
+    for kop, start_year, understandability in itertools.product(KOPS, START_YEARS, UNDERSTANDABILITIES):
+        probs = get_probabilities(kop=kop, start_year=start_year, understandability=understandability)
+        assert_close(probs["archaeology"], arch_prob(kop, start_year, understandability))
+
+def test_dams_match_ladder():
+    for kop, usability, start_year, understandability in itertools.product(KOPS, USABILITIES, START_YEARS,
+                                                                           UNDERSTANDABILITIES):
+        probs = get_probabilities(kop=kop, usability=usability, start_year=start_year,
+                                  understandability=understandability)
+        assert_close(probs["dams"], dam_prob(kop, usability, start_year, understandability))
+
+def test_teens_match_ladder():
+    for visibility, respectability, understandability in itertools.product(VISIBILITIES, RESPECTABILITIES,
+                                                                           UNDERSTANDABILITIES):
+        probs = get_probabilities(visibility=visibility, respectability=respectability,
+                                  understandability=understandability)
+        assert_close(probs["teens"], teen_prob(visibility, respectability, understandability))
+
+def test_tunnels_match_ladder():
+    for sot, visibility, understandability in itertools.product((0, 1, 2), VISIBILITIES, UNDERSTANDABILITIES):
+        probs = get_probabilities(sot=sot, visibility=visibility, understandability=understandability)
+        assert_close(probs["tunnels"], transit_tunnel_prob(sot, understandability, visibility))
+
+def test_short_steps_compound_the_span_odds():
+    probs = get_probabilities(200, kop=1, start_year=6000, understandability=.1)
+    short = get_probabilities(10, kop=1, start_year=6000, understandability=.1)
+    for name in ("archaeology", "dams", "teens", "tunnels"):
+        assert_close(1 - (1 - short[name])**20, probs[name])
+
+def test_batch_matches_scalar():
+    rng = np.random.default_rng(0)
+    size = 2000
+    values = (rng.integers(0, 4, size), rng.choice(START_YEARS, size), rng.choice(USABILITIES, size),
+              rng.choice(VISIBILITIES, size), rng.choice(RESPECTABILITIES, size), rng.integers(0, 3, size),
+              rng.integers(0, 2, size), rng.choice(VALUE_DICE, size))
+    understandability = rng.choice(UNDERSTANDABILITIES, size)
+    for years in (10, 200):
+        batch = HAZARD_MODEL.get_batch_probabilities(values, understandability, years)
+        for trial in range(size):
+            scalar = HAZARD_MODEL.get_probabilities(tuple(value[trial].item() for value in values),
+                                                    understandability[trial].item(), years)
+            np.testing.assert_allclose(batch[:, trial], scalar, rtol=1e-12, atol=1e-15)
@@ -0,0 +1,22 @@
+"""Checks importance sampling against the exact engine"""
+
+import numpy as np
+from exact import simulate_exact
+from importance import simulate_importance
+from test_exact import YEARS, SEED, get_cases, assert_within
+
+def test_importance_matches_exact():
+    trials = 20000
+    for layout, buffs in get_cases():
+        exact = simulate_exact(YEARS, layout, buffs).breach_probability
+        result = simulate_importance(YEARS, layout, buffs, trials, np.random.default_rng(SEED))
+        assert_within(result.breach_probability, exact, trials, result.standard_error)
+
+def test_importance_runs_partial_steps():
+    trials = 20000
+    layout, buffs = next(get_cases())
+    for years, epoch_years in ((2100, 200), (2190, 200), (150, 200), (2100, 50)):
+        exact = simulate_exact(years, layout, buffs, epoch_years=epoch_years).breach_probability
+        result = simulate_importance(years, layout, buffs, trials, np.random.default_rng(SEED),
+                                     epoch_years=epoch_years)
+        assert_within(result.breach_probability, exact, trials, result.standard_error)
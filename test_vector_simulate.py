@@ -0,0 +1,20 @@
+"""Checks the vectorized engine against the exact engine"""
+
+import numpy as np
+from exact import simulate_exact
+from vector_simulate import simulate_batch
+from test_exact import YEARS, SEED, get_cases, assert_within
+
+def test_vector_matches_exact():
+    trials = 20000
+    for layout, buffs in get_cases():
+        exact = simulate_exact(YEARS, layout, buffs).breach_probability
+        result = simulate_batch(YEARS, layout, buffs, trials, np.random.default_rng(SEED))
+        assert_within(result.breaches / trials, exact, trials)
+
+def test_vector_matches_exact_at_short_steps():
+    trials = 20000
+    for layout, buffs in get_cases():
+        exact = simulate_exact(YEARS, layout, buffs, epoch_years=50).breach_probability
+        result = simulate_batch(YEARS, layout, buffs, trials, np.random.default_rng(SEED), 50)
+        assert_within(result.breaches / trials, exact, trials)
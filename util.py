@@ -1,8 +1,11 @@
 """A utility module for helper functions"""
 import pyxel
 
-def center_text(text, page_width, y_coord, text_color, x_coord=0, char_width=pyxel.FONT_WIDTH): #pylint: disable=too-many-arguments
-    """Helper function for calcuating the start x value for centered text."""
+def center_text(text, page_width, y_coord, text_color, x_coord=0, char_width=None): #pylint: disable=too-many-arguments
+    """Helper function for calcuating the start x value for centered text. char_width defaults to pyxel's font
+    width, looked up at call time"""
+    if char_width is None:
+        char_width = pyxel.FONT_WIDTH
 
     lines = text.split("\n")
     line_lengths = [len(line) for line in lines]
@@ -0,0 +1,249 @@
+"""Simulates a whole batch of trials of one site layout at once, advancing every trial one epoch at a time as NumPy
+arrays. Statistically equivalent to running simulate.simulate once per trial with the same epoch length. Every step
+is one set of array operations over all live trials, so short epochs cost steps rather than steps times trials of
+interpreter time"""
+
+from dataclasses import dataclass, astuple
+import numpy as np
+import simulate
+from marker_table import MONOLITH_MASK, get_marker_stats, count_markers
+from adjacency import get_adjacency_bonuses
+from site_grid import SiteMap
+from batch import BatchResult, MARGIN_KEYS
+from event_flags import EVENT_BITS, STAT_EVENTS
+from hazards import HAZARD_MODEL
+
+EPOCH_YEARS = simulate.EPOCH_YEARS
+
+#event codes, in the order simulate.get_random_event checks them. 0 means nothing happened
+EVENT_NAMES = ("", "aliens", "goths", "vikings", "earthquake", "cult-dig", "faultline", "cat-holics", "stonehenge",
+               "flood", "klingon", "turtle", "smog", "park")
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_NAMES)}
+INSTAKILL_EVENTS = ("aliens", "cult-dig")
+
+#map variants produced by simulate.get_modified_map, one bit each
+VIKINGS_VARIANT = 1
+RUINED_VARIANT = 2
+VARIANTS_PER_MAP = (VIKINGS_VARIANT | RUINED_VARIANT) + 1
+
+#fatal event name for each hazard, in the order simulate.simulate rolls them
+HAZARD_EVENTS = HAZARD_MODEL.events
+
+def state_of_tech(current_year, rng, size):
+    """Vectorized simulate.state_of_tech"""
+    die = rng.random(size)
+    if current_year <= 2300:
+        high, medium = .8, .95
+    elif current_year <= 5000:
+        high, medium = .7, .9
+    else:
+        high, medium = .8, .9
+    return np.where(die <= high, 2, np.where(die <= medium, 1, 0))
+
+def get_value_of_materials(current_year, rng, size):
+    """Vectorized simulate.get_value_of_materials"""
+    if current_year < 2300:
+        return rng.integers(0, 2, size)
+    return (rng.random(size) < .33).astype(int)
+
+def get_random_event(current_year, sot, num_monoliths, respectability, global_buffs, rng, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Vectorized simulate.get_random_event. Returns arrays of event codes and event years"""
+    size = len(sot)
+    event_year = current_year - rng.integers(0, epoch_years, size)
+    die = rng.random(size)
+    ladder = simulate.get_event_ladder(current_year, sot, num_monoliths, respectability, global_buffs)
+    if epoch_years != EPOCH_YEARS:
+        ladder = get_step_ladder(ladder, epoch_years/EPOCH_YEARS)
+    return select_event(ladder, die), event_year
+
+def get_step_ladder(ladder, fraction):
+    """Returns an event ladder for a step of fraction*EPOCH_YEARS, whose rungs claim consecutive die ranges of
+    1-(1-p)**fraction for odds p per EPOCH_YEARS, so it picks the events simulate.get_ladder_die does. Works on
+    scalars or on arrays of trials"""
+    covered = low = 0
+    step_ladder = []
+    for name, condition, threshold in ladder:
+        odds = np.where(condition, np.maximum(threshold - covered, 0), 0)
+        low = low + 1-(1-odds)**fraction
+        step_ladder.append((name, condition, low))
+        covered = np.where(odds > 0, threshold, covered)
+    return step_ladder
+
+def select_event(ladder, die):
+    """Returns the event code each die roll lands on in an event ladder"""
+    conditions = [condition & (die < threshold) for _, condition, threshold in ladder]
+    choices = [EVENT_CODES[name] for name, _, _ in ladder]
+    return np.select(conditions, choices, default=0)
+
+def get_knowledge_of_past(visibility, respectability, likability, understandability):
+    """Vectorized simulate.get_knowledge_of_past"""
+    return np.select([understandability > .5,
+                      visibility > .4,
+                      (visibility > .2) & ((likability > .3) | (respectability > .3))],
+                     [3, 2, 1], default=0)
+
+def get_map_variants(site_map):
+    """Returns the site map as modified by every combination of vikings and earthquake/faultline events"""
+    variants = {}
+    for variant in range(VARIANTS_PER_MAP):
+        vikings = bool(variant & VIKINGS_VARIANT)
+        ruined = bool(variant & RUINED_VARIANT)
+        variants[variant] = simulate.get_modified_map(site_map, vikings, ruined, False)
+    return variants
+
+@dataclass(frozen=True)
+class VariantTables:
+    """Per-map-variant arrays that simulate.get_stats reads, stacked so any mix of variants is one fancy index.
+    Variant v of layout n is row n*VARIANTS_PER_MAP + v"""
+    marker_counts: np.ndarray #(variants, markers) tile counts
+    terraforming_weights: np.ndarray #(variants, markers) weights of simulate.get_terraforming_weights
+    adjacency: np.ndarray #(goths, variants, 7) AdjacencyBonuses fields
+
+def get_variant_tables(site_maps):
+    """Builds the VariantTables of every map variant of a list of SiteMaps"""
+    variant_maps = [variant_map for site_map in site_maps for variant_map in get_map_variants(site_map).values()]
+    return VariantTables(
+        marker_counts=np.array([variant_map.marker_counts() for variant_map in variant_maps], dtype=float),
+        terraforming_weights=np.array([simulate.get_terraforming_weights(variant_map)
+                                       for variant_map in variant_maps]),
+        adjacency=np.array([[astuple(get_adjacency_bonuses(variant_map, goths)) for variant_map in variant_maps]
+                            for goths in (False, True)]))
+
+class CommonDice:
+    """Wraps a Generator so that trial k of every layout in a batch sees the same dice. Each draw is made for every
+    trial number and handed out to the live trials, so results pair up across layouts and do not depend on which
+    other layouts share the batch"""
+    def __init__(self, rng, trials):
+        self.rng = rng
+        self.trials = trials
+        self.trial_numbers = np.arange(trials) #trial number of each live trial, set by the caller
+
+    def random(self, size):
+        """Returns one uniform die per live trial. size must be the number of live trials"""
+        return self.rng.random(self.trials)[self.trial_numbers]
+
+    def integers(self, low, high, size):
+        """Returns one integer die on [low, high) per live trial. size must be the number of live trials"""
+        return self.rng.integers(low, high, self.trials)[self.trial_numbers]
+
+def get_batch_stats(tables, buff_counts, current_year, sot, variant, flags): #pylint: disable=too-many-arguments,too-many-locals
+    """Vectorized simulate.get_stats. Evaluates the stats once per distinct (map variant, event flags, state of
+    tech) among the trials and returns a (5, trials) array of stats"""
+    keys = ((variant << len(EVENT_BITS)) | flags)*3 + sot
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    key_variant, key_flags = np.divmod(unique_keys // 3, 1 << len(EVENT_BITS))
+    key_sot = unique_keys % 3
+    catholics, stonehenge, flood, goths, faultline, park = \
+        ((key_flags & EVENT_BITS[name]) != 0 for name in STAT_EVENTS)
+    #klingon and turtle both follow cat-holics, as in simulate.compute_stats
+    marker_stats = np.array([get_marker_stats(current_year, key_sot_i, catholic, catholic, goth, fault)
+                             for key_sot_i, catholic, goth, fault in zip(key_sot.tolist(), catholics.tolist(),
+                                                                          goths.tolist(), faultline.tolist())])
+
+    counts = tables.marker_counts[key_variant] + buff_counts
+    usability, visibility, respectability, likability, understandability = \
+        (counts[:, None, :] @ marker_stats)[:, 0, :].T
+    usability = usability + 100
+    visibility_scale = np.where(visibility < .1, .1, np.where(visibility < 1, .8, 1))
+    respectability = respectability * visibility_scale
+    likability = likability * visibility_scale
+    understandability = understandability * visibility_scale
+
+    vis_bonus, synergy, spooky_respectability, spooky_likability, pro_educational, monolith_usability, \
+        monolith_respectability = tables.adjacency[goths.astype(np.int64), key_variant].T
+    visibility = visibility + vis_bonus
+    understandability = understandability + synergy
+    respectability = respectability + spooky_respectability
+    likability = likability + spooky_likability
+    understandability = understandability + pro_educational
+    terraforming = (tables.terraforming_weights[key_variant][:, None, :] @ marker_stats)[:, 0, :].T
+    usability = usability + terraforming[0]
+    visibility = visibility + terraforming[1]
+    respectability = respectability + terraforming[2]
+    likability = likability + terraforming[3]
+    understandability = understandability + terraforming[4]
+    usability = usability + monolith_usability
+    respectability = respectability + monolith_respectability
+
+    likability = likability + np.where(catholics, 10, 0) + np.where(stonehenge, 7, 0) + np.where(park, 15, 0)
+    usability = usability + np.where(flood, 20, 0) - np.where(park, 20, 0)
+    visibility = np.maximum(0, visibility)
+
+    unique_stats = np.clip(np.array([usability, visibility, respectability, likability, understandability]),
+                           -100, 100) / 100
+    return unique_stats[:, inverse.reshape(-1)]
+
+def simulate_batch(years, site_map, global_buffs, trials, rng=None, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments
+    """Runs `trials` simulations of a layout together and returns a BatchResult"""
+    return simulate_layouts(years, [site_map], global_buffs, trials, rng, epoch_years)[0]
+
+def simulate_layouts(years, site_maps, global_buffs, trials, rng=None, epoch_years=EPOCH_YEARS): #pylint: disable=too-many-arguments,too-many-locals
+    """Runs `trials` simulations of each of a list of layouts together, with common random numbers: trial k of
+    every layout rolls the same dice. Layouts step epoch_years at a time, as in simulate.simulate. Returns a
+    BatchResult per layout"""
+    if rng is None:
+        rng = np.random.default_rng()
+    site_maps = [SiteMap.coerce(site_map) for site_map in site_maps]
+    tables = get_variant_tables(site_maps)
+    buff_counts = count_markers(global_buffs)
+    layout_monoliths = np.array([int(MONOLITH_MASK @ site_map.marker_counts()) for site_map in site_maps])
+    dice = CommonDice(rng, trials)
+
+    total = len(site_maps)*trials
+    layout = np.repeat(np.arange(len(site_maps)), trials)
+    variant = layout*VARIANTS_PER_MAP
+    flags = np.zeros(total, dtype=np.int64)
+    margins = np.ones((len(MARGIN_KEYS), total))
+    cause = np.zeros(total, dtype=np.int64) #0 while alive, otherwise 1 + index into fatal_events
+    fatal_events = INSTAKILL_EVENTS + HAZARD_EVENTS
+    live = np.arange(total)
+
+    for current_year, step_years in simulate.get_steps(years, epoch_years):
+        if len(live) == 0:
+            break
+        size = len(live)
+        dice.trial_numbers = live % trials
+
+        sot = state_of_tech(current_year, dice, size)
+        usability, visibility, respectability, likability, understandability = \
+            get_batch_stats(tables, buff_counts, current_year, sot, variant[live], flags[live])
+
+        event, _ = get_random_event(current_year, sot, layout_monoliths[layout[live]], respectability,
+                                    global_buffs, dice, step_years)
+        for name in STAT_EVENTS:
+            flags[live[event == EVENT_CODES[name]]] |= EVENT_BITS[name]
+        variant[live[event == EVENT_CODES["vikings"]]] |= VIKINGS_VARIANT
+        variant[live[(event == EVENT_CODES["earthquake"]) | (event == EVENT_CODES["faultline"])]] |= RUINED_VARIANT
+
+        alive = np.ones(size, dtype=bool)
+        for code, name in enumerate(INSTAKILL_EVENTS):
+            killed = event == EVENT_CODES[name]
+            cause[live[killed]] = code + 1
+            alive &= ~killed
+
+        kop = get_knowledge_of_past(visibility, respectability, likability, understandability)
+        vom = get_value_of_materials(current_year, dice, size)
+        value_die = dice.random(size)
+        probs = HAZARD_MODEL.get_batch_probabilities((kop, current_year-step_years, usability, visibility,
+                                                      respectability, sot, vom, value_die), understandability,
+                                                     step_years)
+        for hazard, prob in enumerate(probs):
+            die = dice.random(size)
+            breached = alive & (die < prob)
+            survived = alive & ~breached
+            margins[hazard, live[survived]] = np.minimum(margins[hazard, live[survived]], (die-prob)[survived])
+            margins[hazard, live[breached]] = 0
+            cause[live[breached]] = len(INSTAKILL_EVENTS) + hazard + 1
+            alive = survived
+        live = live[alive]
+
+    results = []
+    for start in range(0, total, trials):
+        layout_cause = cause[start:start+trials]
+        result = BatchResult(trials=trials, breaches=int(np.count_nonzero(layout_cause)))
+        counts = np.bincount(layout_cause, minlength=len(fatal_events)+1)
+        result.breach_counts = {name: int(counts[code+1]) for code, name in enumerate(fatal_events)
+                                if counts[code+1]}
+        result.margins = {key: margins[k, start:start+trials].tolist() for k, key in enumerate(MARGIN_KEYS)}
+        results.append(result)
+    return results